@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the Maestral Qt GUI. They are optional, not part of the package and not
+run by CI. Install the package with its benchmark requirements and run them headless
+from the repository root::
+
+    pip install -e .[benchmarks]
+    pytest benchmarks
+
+Results are saved as JSON to ``.benchmarks`` and can be compared between runs with
+``pytest-benchmark compare``.
+"""
+
+# system imports
+import os
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# external packages
+import pytest
+from PyQt6 import QtWidgets
+
+# local imports
+from fakes import wide_tree, deep_tree, excluded_tree
+
+
+# =============================================================================
+# Fixtures
+# =============================================================================
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    yield app
+
+
+@pytest.fixture(scope="session")
+def wide():
+    return wide_tree()
+
+
+@pytest.fixture(scope="session")
+def deep():
+    return deep_tree()
+
+
+@pytest.fixture(scope="session")
+def excluded():
+    return excluded_tree()
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic Dropbox trees and stand-ins for the folder loader and the Maestral proxy, to
+benchmark the selective sync dialog without a daemon.
+"""
+
+# external packages
+from PyQt6 import QtCore
+
+# local imports
+from maestral_qt.listing_cache import FolderEntry
+from maestral_qt.name_index import NameIndex
+
+
+# =============================================================================
+# Synthetic Dropbox trees
+# =============================================================================
+
+
+def _join(folder, name):
+    return f"/{name}" if folder == "/" else f"{folder}/{name}"
+
+
+def _add_folder(tree, folder, n_folders, n_files, prefix=""):
+    # adds entries for subfolders and files to a folder, returns the subfolder paths
+    entries = tree.setdefault(folder, [])
+    subfolders = []
+
+    for i in range(n_folders):
+        path = _join(folder, f"{prefix}Folder {i:05d}")
+        entries.append(FolderEntry(path, path.lower(), True, 0))
+        tree.setdefault(path.lower(), [])
+        subfolders.append(path.lower())
+
+    for i in range(n_files):
+        path = _join(folder, f"{prefix}File {i:05d}.txt")
+        entries.append(FolderEntry(path, path.lower(), False, (i * 7919) % 10**6))
+
+    return subfolders
+
+
+def wide_tree(n_children=100000):
+    """
+    Returns a tree whose root has many children, one in ten of them a folder.
+
+    :param int n_children: Number of children of the root.
+    :returns: Folder entries by normalized folder path.
+    :rtype: dict[str, list[FolderEntry]]
+    """
+    tree = {}
+    _add_folder(tree, "/", n_children // 10, n_children - n_children // 10)
+    return tree
+
+
+def deep_tree(depth=50, n_files=10):
+    """
+    Returns a tree of nested folders, each with a few files.
+
+    :param int depth: Number of nested folders.
+    :param int n_files: Number of files in each folder.
+    :returns: Folder entries by normalized folder path.
+    :rtype: dict[str, list[FolderEntry]]
+    """
+    tree = {}
+    folder = "/"
+
+    for level in range(depth):
+        folder = _add_folder(tree, folder, 1, n_files, prefix=f"L{level} ")[0]
+
+    return tree
+
+
+def excluded_tree(n_folders=100, n_subfolders=100):
+    """
+    Returns a tree of folders with subfolders and the paths of all subfolders, to be
+    excluded from syncing.
+
+    :param int n_folders: Number of folders in the root.
+    :param int n_subfolders: Number of subfolders in each folder.
+    :returns: Folder entries by normalized folder path and excluded paths.
+    :rtype: tuple[dict[str, list[FolderEntry]], list[str]]
+    """
+    tree = {}
+    excluded = []
+
+    for folder in _add_folder(tree, "/", n_folders, 10):
+        excluded.extend(_add_folder(tree, folder, n_subfolders, 10))
+
+    return tree, excluded
+
+
+def folder_sizes(tree):
+    """
+    Returns the total size of each folder in a tree.
+
+    :param dict[str, list[FolderEntry]] tree: Folder entries by normalized path.
+    :rtype: dict[str, int]
+    """
+    sizes = {}
+
+    # children have longer paths than their parents
+    for folder in sorted(tree, key=len, reverse=True):
+        sizes[folder] = sum(
+            sizes.get(e.path_lower, 0) if e.is_folder else e.size for e in tree[folder]
+        )
+
+    return sizes
+
+
+# =============================================================================
+# Stand-ins
+# =============================================================================
+
+
+class FakeListFolder(QtCore.QObject):
+    """
+    A stand-in for :class:`maestral_qt.selective_sync_dialog.AsyncListFolder` which
+    serves a synthetic tree from memory, as if all folders were cached and fresh.
+    Items then load their children synchronously, without threads or a daemon.
+
+    :param dict[str, list[FolderEntry]] tree: Folder entries by normalized path.
+    :param parent: QObject. Defaults to None.
+    """
+
+    def __init__(self, tree, parent=None):
+        super().__init__(parent=parent)
+        self.tree = tree
+        self.name_index = NameIndex()
+        self._sizes = folder_sizes(tree)
+
+    def cachedChildren(self, path):
+        return self.tree.get(path, [])
+
+    def isFresh(self, path):
+        return True
+
+    def folderSize(self, path):
+        return self._sizes.get(path)
+
+    def cancelListing(self, task):
+        pass
+
+    def abortListing(self):
+        pass
+
+
+class FakeMaestral:
+    """A stand-in for the Maestral proxy as used by the selective sync dialog."""
+
+    config_name = "benchmarks"
+    connected = True
+
+    def __init__(self, excluded_items=()):
+        self.excluded_items = list(excluded_items)
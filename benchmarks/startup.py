@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Starts the GUI with :func:`maestral_qt.main.run` against a stand-in daemon, under the
+offscreen Qt platform, and quits once the GUI is set up. Prints the startup milestones
+and the modules which were imported when the tray icon was first shown as JSON. Run
+it with ``python -X importtime`` to measure import times as well.
+"""
+
+# system imports
+import os
+import sys
+import json
+import threading
+from types import SimpleNamespace
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# local imports, first such that their import time includes all dependencies
+import maestral_qt.main
+import maestral_qt.utils
+from maestral_qt.tracing import tracer
+
+# external packages
+from PyQt6 import QtCore, QtWidgets
+from maestral.daemon import Start
+
+
+class StandInDaemon:
+    """
+    A stand-in for :class:`maestral.daemon.MaestralProxy`, connected to a daemon which
+    is linked and idle. The GUI is quit once it starts syncing, which is the last step
+    of its startup.
+
+    :param str config_name: Name of the Maestral config.
+    """
+
+    quitting = threading.Event()
+
+    pending_link = False
+    pending_dropbox_folder = False
+    paused = False
+    running = True
+    connected = True
+    status = "Up to date"
+    sync_errors = []
+    fatal_errors = []
+    excluded_items = []
+    dropbox_path = os.path.expanduser("~/Dropbox")
+    account_profile_pic_path = ""
+    notification_level = 15
+
+    # automatic update checks are disabled
+    conf = {("app", "update_notification_interval"): 0}
+
+    def __init__(self, config_name, fallback=False):
+        self.config_name = config_name
+        self._m = SimpleNamespace(_pyroConnection=None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def __getattr__(self, name):
+        # workers look up their target explicitly
+        return object.__getattribute__(self, name)
+
+    def get_conf(self, section, name):
+        return self.conf.get((section, name))
+
+    def get_state(self, section, name):
+        return ""
+
+    def start_sync(self):
+        QtCore.QTimer.singleShot(0, self._quit)
+
+    def status_change_longpoll(self, timeout=60):
+        return self.quitting.wait(timeout)
+
+    def _quit(self):
+        self.quitting.set()
+        QtWidgets.QApplication.quit()
+
+
+def main():
+    modules_at_tray_icon = []
+    show = maestral_qt.main.MaestralGuiApp.show
+
+    def show_and_record_modules(tray_icon):
+        show(tray_icon)
+        if not modules_at_tray_icon:
+            modules_at_tray_icon.extend(sorted(sys.modules))
+
+    tracer.enabled = True
+
+    maestral_qt.main.MaestralGuiApp.show = show_and_record_modules
+    maestral_qt.main.MaestralProxy = StandInDaemon
+    maestral_qt.utils.MaestralProxy = StandInDaemon
+
+    # the offscreen platform has no system tray, show the icon as on a desktop
+    maestral_qt.main.MaestralGuiApp.isSystemTrayAvailable = staticmethod(lambda: True)
+
+    try:
+        maestral_qt.main.run("benchmarks", Start.AlreadyRunning)
+    except SystemExit:
+        # let workers finish before the app is deleted
+        for pool in maestral_qt.utils.executor._pools.values():
+            pool.waitForDone()
+
+    result = {
+        "milestones": tracer.milestones(),
+        "modules_at_tray_icon": modules_at_tray_icon,
+    }
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
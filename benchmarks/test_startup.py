@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the startup of the GUI. Each run starts :mod:`startup` in a new process.
+The time to import :mod:`maestral_qt.main`, to construct the app, to show the tray icon
+and to set up the GUI for a linked account must stay within a budget. Budgets are given
+in seconds and can be changed with environment variables, for instance to run the
+benchmark on slower machines::
+
+    MAESTRAL_QT_BUDGET_TRAY_ICON=1.5 pytest benchmarks/test_startup.py
+
+Windows, dialogs and their dependencies must not be imported before the tray icon is
+shown.
+"""
+
+# system imports
+import os
+import sys
+import json
+import subprocess
+
+# external packages
+import pytest
+
+
+STARTUP_SCRIPT = os.path.join(os.path.dirname(__file__), "startup.py")
+
+# default budgets in seconds, all but the import time are counted from calling run()
+BUDGETS = {
+    "import": 1.0,
+    "app_constructed": 0.5,
+    "tray_icon": 0.5,
+    "linked_ui": 1.0,
+}
+
+# modules which are only imported on first use, after the tray icon is shown
+LAZY_MODULES = (
+    "maestral_qt.activity_window",
+    "maestral_qt.bandwidth_dialog",
+    "maestral_qt.dropbox_location_dialog",
+    "maestral_qt.relink_dialog",
+    "maestral_qt.selective_sync_dialog",
+    "maestral_qt.settings_window",
+    "maestral_qt.setup_dialog",
+    "maestral_qt.sync_issues_window",
+    "markdown2",
+)
+
+MILESTONES = {
+    "app_constructed": "app constructed",
+    "tray_icon": "tray icon shown",
+    "linked_ui": "linked UI set up",
+}
+
+
+def budget(name):
+    return float(os.environ.get(f"MAESTRAL_QT_BUDGET_{name.upper()}", BUDGETS[name]))
+
+
+def import_time(stderr, module):
+    """
+    Returns the cumulative time to import a module, from the output of
+    ``python -X importtime``.
+
+    :param str stderr: Output of the interpreter.
+    :param str module: Name of the module.
+    :returns: Import time in seconds.
+    :rtype: float
+    """
+    for line in stderr.splitlines():
+        if line.startswith("import time:"):
+            _, cumulative, name = line[len("import time:") :].split("|")
+            if name.strip() == module:
+                return int(cumulative) / 1e6
+
+    raise ValueError(f"{module} was not imported")
+
+
+def start_gui(home):
+    """
+    Starts the GUI against a stand-in daemon until it is set up.
+
+    :param home: Home directory for the GUI, such that no user config is used.
+    :returns: Import time of the GUI, the time of each startup milestone and the
+        modules which were imported when the tray icon was first shown.
+    :rtype: tuple[dict[str, float], list[str]]
+    """
+    env = dict(os.environ, HOME=str(home), QT_QPA_PLATFORM="offscreen")
+    env.pop("XDG_CONFIG_HOME", None)
+    env.pop("XDG_DATA_HOME", None)
+
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", STARTUP_SCRIPT],
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr)
+
+    result = json.loads(process.stdout.splitlines()[-1])
+    milestones = result["milestones"]
+
+    timings = {"import": import_time(process.stderr, "maestral_qt.main")}
+
+    for name, milestone in MILESTONES.items():
+        timings[name] = milestones[milestone] - milestones["run"]
+
+    return timings, result["modules_at_tray_icon"]
+
+
+def test_startup_time(benchmark, tmp_path):
+    runs = []
+
+    def run():
+        timings, _ = start_gui(tmp_path)
+        runs.append(timings)
+
+    benchmark.pedantic(run, rounds=5, iterations=1)
+
+    # the fastest run is least affected by other processes
+    timings = {name: min(r[name] for r in runs) for name in BUDGETS}
+    benchmark.extra_info.update(timings)
+
+    for name, seconds in timings.items():
+        assert seconds <= budget(name), f"{name} took {seconds:.3f} s"
+
+
+def test_lazy_imports(tmp_path):
+    _, modules = start_gui(tmp_path)
+
+    imported = [m for m in modules if m in LAZY_MODULES]
+    imported += [m for m in modules if m.startswith("maestral_qt.resources.ui_")]
+
+    assert not imported, "imported before the tray icon was shown"
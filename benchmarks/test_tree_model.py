@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the tree model of the selective sync dialog, for a folder with 100k
+children, 50 nested folders and 10k excluded folders.
+"""
+
+# external packages
+import pytest
+from PyQt6.QtCore import QModelIndex, Qt
+
+# local imports
+from maestral_qt.selective_sync_dialog import (
+    DropboxPathItem,
+    FileSystemModel,
+    SelectiveSyncDialog,
+)
+from fakes import FakeListFolder, FakeMaestral
+
+
+def make_model(tree, excluded_items=()):
+    loader = FakeListFolder(tree)
+    root = DropboxPathItem(loader, set(excluded_items))
+    return FileSystemModel(root)
+
+
+def load_model(tree, excluded_items=()):
+    model = make_model(tree, excluded_items)
+    model.rowCount(QModelIndex())  # lists the root
+    return model
+
+
+def scroll(model, parent=QModelIndex()):
+    # requests all rows of a folder like a view which is scrolled through them
+    for row in range(model.rowCount(parent)):
+        for column in range(model.columnCount(parent)):
+            index = model.index(row, column, parent)
+            model.parent(index)
+            model.data(index, Qt.ItemDataRole.DisplayRole)
+            model.data(index, Qt.ItemDataRole.CheckStateRole)
+
+
+# =============================================================================
+# Model construction
+# =============================================================================
+
+
+@pytest.mark.parametrize("name", ["wide", "deep", "excluded"])
+def test_construct(benchmark, qapp, request, name):
+    tree = request.getfixturevalue(name)
+    excluded_items = ()
+
+    if name == "excluded":
+        tree, excluded_items = tree
+
+    benchmark(load_model, tree, excluded_items)
+
+
+# =============================================================================
+# Expanding and scrolling
+# =============================================================================
+
+
+def test_expand_deep(benchmark, qapp, deep):
+    def expand():
+        model = load_model(deep)
+        parent = QModelIndex()
+        while model.rowCount(parent) > 0:
+            parent = model.index(0, 0, parent)
+        return model
+
+    benchmark(expand)
+
+
+def test_expand_excluded(benchmark, qapp, excluded):
+    tree, excluded_items = excluded
+
+    def expand():
+        model = load_model(tree, excluded_items)
+        for row in range(model.rowCount(QModelIndex())):
+            model.rowCount(model.index(row, 0, QModelIndex()))
+        return model
+
+    benchmark(expand)
+
+
+def test_scroll_wide(benchmark, qapp, wide):
+    model = load_model(wide)
+    benchmark(scroll, model)
+
+
+# =============================================================================
+# Check states
+# =============================================================================
+
+
+def test_toggle_all_wide(benchmark, qapp, wide):
+    model = load_model(wide)
+    states = iter(range(10**9))
+
+    def toggle():
+        model.setChildrenCheckState(QModelIndex(), 2 * (next(states) % 2))
+
+    benchmark(toggle)
+
+
+def test_toggle_excluded(benchmark, qapp, excluded):
+    tree, excluded_items = excluded
+    model = load_model(tree, excluded_items)
+    index = model.index(0, model.checkbox_column, QModelIndex())
+    model.rowCount(model.index(0, 0, QModelIndex()))
+    states = iter(range(10**9))
+
+    def toggle():
+        model.setData(index, 2 * (next(states) % 2), Qt.ItemDataRole.CheckStateRole)
+
+    benchmark(toggle)
+
+
+# =============================================================================
+# Sorting
+# =============================================================================
+
+
+@pytest.mark.parametrize("column", [0, 2])
+def test_sort_wide(benchmark, qapp, wide, column):
+    model = load_model(wide)
+    orders = iter(range(10**9))
+
+    def sort():
+        order = Qt.SortOrder(next(orders) % 2)
+        model.sort(column, order)
+
+    benchmark(sort)
+
+
+# =============================================================================
+# Excluded items
+# =============================================================================
+
+
+def test_excluded_items(benchmark, qapp, excluded):
+    tree, excluded_items = excluded
+    mdbx = FakeMaestral(excluded_items)
+
+    dialog = SelectiveSyncDialog(mdbx)
+    dialog.async_loader = FakeListFolder(tree, dialog)
+    dialog.dbx_model = make_model(tree, excluded_items)
+
+    # list all folders and include every other one
+    model = dialog.dbx_model
+    for row in range(model.rowCount(QModelIndex())):
+        index = model.index(row, 0, QModelIndex())
+        model.rowCount(index)
+        if row % 2:
+            check_index = model.index(row, model.checkbox_column, QModelIndex())
+            model.setData(check_index, 2, Qt.ItemDataRole.CheckStateRole)
+
+    result = benchmark(dialog.get_excluded_items)
+    assert len(result) == len(excluded_items) // 2
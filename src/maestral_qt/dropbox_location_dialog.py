@@ -113,6 +113,7 @@ class DropboxLocationDialog(QtWidgets.QDialog, Ui_Dialog):
 
     @QtCore.pyqtSlot()
     def on_unlink_done(self):
+        self.mdbx.invalidate()
         self.spinner.stopAnimation()
         stop_maestral_daemon_process(self.mdbx.config_name)
 
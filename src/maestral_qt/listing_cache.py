@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+
+# system imports
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+import itertools
+from operator import itemgetter
+from collections import namedtuple
+
+# maestral modules
+from maestral.core import FileMetadata, FolderMetadata
+from maestral.utils.appdirs import get_cache_path
+
+
+FolderEntry = namedtuple(
+    "FolderEntry", ("path_display", "path_lower", "is_folder", "size")
+)
+"""A compact representation of an item in a Dropbox folder listing."""
+
+
+def entry_from_metadata(md):
+    """
+    Converts Dropbox metadata to a :class:`FolderEntry`.
+
+    :param md: Dropbox file or folder metadata.
+    :returns: Folder entry.
+    :rtype: FolderEntry
+    """
+    size = md.size if isinstance(md, FileMetadata) else 0
+    return FolderEntry(
+        md.path_display, md.path_lower, isinstance(md, FolderMetadata), size
+    )
+
+
+def listing_fingerprint(entries):
+    """
+    Returns a fingerprint of a folder listing which changes when any item in the folder
+    is added, removed, renamed or resized.
+
+    :param list[FolderEntry] entries: Folder entries.
+    :rtype: str
+    """
+    digest = hashlib.sha1()
+    for entry in sorted(entries, key=lambda e: e.path_lower):
+        digest.update(json.dumps(entry).encode())
+    return digest.hexdigest()
+
+
+def self_and_ancestors(path_lower):
+    """
+    Yields a Dropbox path followed by all its ancestors, up to the root.
+
+    :param str path_lower: Normalized Dropbox path.
+    :returns: Iterator over normalized paths.
+    """
+    yield path_lower
+
+    while path_lower != "/":
+        path_lower = os.path.dirname(path_lower)
+        yield path_lower
+
+
+class ListingCache:
+    """
+    A persistent cache of Dropbox folder listings, keyed by lower-case path. The cache
+    is stored in an SQLite database, one per Maestral config. It is safe to use from
+    multiple threads.
+
+    The Maestral daemon does not expose list folder cursors. Each listing is therefore
+    stored with a fingerprint of its content instead, which is used to detect changes
+    when a listing is revalidated.
+
+    The cache also stores the total size of folders. When the listing of a folder with
+    a known size changes, the size of the folder and all its ancestors is updated by
+    the change in size of its files and removed subfolders. Added subfolders start
+    with their known size, or with zero, and grow as their own listings are stored.
+
+    Entries of recursive listings are staged in a temporary table until the listing
+    is complete, such that they do not need to be kept in memory.
+
+    :param str config_name: Name of the Maestral config.
+    """
+
+    def __init__(self, config_name):
+        self.config_name = config_name
+        self._path = get_cache_path("maestral", f"{config_name}-folders.db")
+        self._lock = threading.Lock()
+        self._con = None
+        self._closed = False
+
+    def _connection(self):
+        if self._closed:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed cache")
+        if not self._con:
+            self._con = sqlite3.connect(self._path, check_same_thread=False)
+            self._con.execute(
+                "CREATE TABLE IF NOT EXISTS folders "
+                "(path_lower TEXT PRIMARY KEY, fingerprint TEXT, entries TEXT)"
+            )
+            self._con.execute(
+                "CREATE TABLE IF NOT EXISTS sizes "
+                "(path_lower TEXT PRIMARY KEY, size INTEGER)"
+            )
+            self._con.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            self._con.execute(
+                "CREATE TEMP TABLE staged (key INTEGER, parent TEXT, entry TEXT)"
+            )
+            self._con.execute("CREATE INDEX temp.staged_parent ON staged (key, parent)")
+        return self._con
+
+    def get(self, path_lower):
+        """
+        Returns the cached listing of a folder.
+
+        :param str path_lower: Normalized path of the folder.
+        :returns: List of entries or ``None`` if the folder is not cached.
+        :rtype: list[FolderEntry] | None
+        """
+        try:
+            with self._lock:
+                row = (
+                    self._connection()
+                    .execute(
+                        "SELECT entries FROM folders WHERE path_lower = ?",
+                        (path_lower,),
+                    )
+                    .fetchone()
+                )
+        except sqlite3.Error:
+            return None
+
+        if row is None:
+            return None
+
+        return [FolderEntry(*e) for e in json.loads(row[0])]
+
+    def set(self, path_lower, entries):
+        """
+        Stores the complete listing of a folder. Existing entries are replaced unless
+        their fingerprint is unchanged.
+
+        :param str path_lower: Normalized path of the folder.
+        :param list[FolderEntry] entries: Folder entries.
+        :returns: Whether the cached listing changed.
+        :rtype: bool
+        """
+        fingerprint = listing_fingerprint(entries)
+
+        try:
+            with self._lock, self._connection() as con:
+                row = con.execute(
+                    "SELECT fingerprint, entries FROM folders WHERE path_lower = ?",
+                    (path_lower,),
+                ).fetchone()
+
+                if row and row[0] == fingerprint:
+                    return False
+
+                con.execute(
+                    "INSERT OR REPLACE INTO folders VALUES (?, ?, ?)",
+                    (path_lower, fingerprint, json.dumps(entries)),
+                )
+
+                old_entries = (
+                    [FolderEntry(*e) for e in json.loads(row[1])] if row else []
+                )
+                self._update_sizes(con, path_lower, old_entries, entries)
+
+                return True
+        except sqlite3.Error:
+            return False
+
+    def _update_sizes(self, con, path_lower, old_entries, entries):
+        # updates the sizes of a folder and its ancestors after its listing changed
+        if self._size(con, path_lower) is None:
+            return
+
+        old_folders = {e.path_lower for e in old_entries if e.is_folder}
+        folders = {e.path_lower for e in entries if e.is_folder}
+
+        delta = sum(e.size for e in entries if not e.is_folder)
+        delta -= sum(e.size for e in old_entries if not e.is_folder)
+
+        for folder in old_folders - folders:
+            delta -= self._size(con, folder) or 0
+            con.execute(
+                "DELETE FROM sizes "
+                "WHERE path_lower = ? OR substr(path_lower, 1, ?) = ?",
+                (folder, len(folder) + 1, folder + "/"),
+            )
+
+        for folder in folders - old_folders:
+            size = self._size(con, folder)
+            if size is None:
+                con.execute("INSERT INTO sizes VALUES (?, 0)", (folder,))
+            else:
+                delta += size
+
+        if delta:
+            con.executemany(
+                "UPDATE sizes SET size = size + ? WHERE path_lower = ?",
+                [(delta, path) for path in self_and_ancestors(path_lower)],
+            )
+
+    @staticmethod
+    def _size(con, path_lower):
+        row = con.execute(
+            "SELECT size FROM sizes WHERE path_lower = ?", (path_lower,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def stage(self, key, entries):
+        """
+        Stores entries of a recursive listing temporarily, until the listing is
+        complete and stored with :meth:`commit_staged`.
+
+        :param int key: Key of the recursive listing.
+        :param list[FolderEntry] entries: Any entries of the listing.
+        """
+        rows = [
+            (key, os.path.dirname(entry.path_lower), json.dumps(entry))
+            for entry in entries
+        ]
+
+        try:
+            with self._lock, self._connection() as con:
+                con.executemany("INSERT INTO staged VALUES (?, ?, ?)", rows)
+        except sqlite3.Error:
+            pass
+
+    def commit_staged(self, key, folders):
+        """
+        Stores the complete listings of many folders at once, in a single transaction,
+        from the staged entries of a recursive listing. Staged entries are removed.
+
+        :param int key: Key of the recursive listing.
+        :param folders: Normalized paths of all folders in the recursive listing,
+            including empty folders.
+        """
+        empty_folders = set(folders)
+
+        try:
+            with self._lock, self._connection() as con:
+                rows = con.execute(
+                    "SELECT parent, entry FROM staged WHERE key = ? ORDER BY parent",
+                    (key,),
+                )
+
+                for parent, group in itertools.groupby(rows, key=itemgetter(0)):
+                    entries = [FolderEntry(*json.loads(e)) for _, e in group]
+                    con.execute(
+                        "INSERT OR REPLACE INTO folders VALUES (?, ?, ?)",
+                        (parent, listing_fingerprint(entries), json.dumps(entries)),
+                    )
+                    empty_folders.discard(parent)
+
+                con.executemany(
+                    "INSERT OR REPLACE INTO folders VALUES (?, ?, ?)",
+                    [(p, listing_fingerprint([]), "[]") for p in empty_folders],
+                )
+                con.execute("DELETE FROM staged WHERE key = ?", (key,))
+        except sqlite3.Error:
+            pass
+
+    def discard_staged(self, key):
+        """
+        Removes the staged entries of a recursive listing which did not complete.
+
+        :param int key: Key of the recursive listing.
+        """
+        try:
+            with self._lock, self._connection() as con:
+                con.execute("DELETE FROM staged WHERE key = ?", (key,))
+        except sqlite3.Error:
+            pass
+
+    def get_size(self, path_lower):
+        """
+        Returns the cached size of a folder.
+
+        :param str path_lower: Normalized path of the folder.
+        :returns: Total size of all files in the folder and its descendants or
+            ``None`` if the size is not cached.
+        :rtype: int | None
+        """
+        try:
+            with self._lock:
+                return self._size(self._connection(), path_lower)
+        except sqlite3.Error:
+            return None
+
+    def set_sizes(self, sizes):
+        """
+        Stores the sizes of folders.
+
+        :param dict[str, int] sizes: Total size of all files in each folder and its
+            descendants, by normalized folder path.
+        """
+        try:
+            with self._lock, self._connection() as con:
+                con.executemany(
+                    "INSERT OR REPLACE INTO sizes VALUES (?, ?)", sizes.items()
+                )
+        except sqlite3.Error:
+            pass
+
+    def check_namespace(self, namespace_id):
+        """
+        Clears the cache if it was created for a different root namespace, i.e., if
+        a different Dropbox account has been linked since.
+
+        :param str namespace_id: ID of the current root namespace.
+        """
+        try:
+            with self._lock, self._connection() as con:
+                row = con.execute(
+                    "SELECT value FROM meta WHERE key = 'namespace_id'"
+                ).fetchone()
+
+                if not row or row[0] != namespace_id:
+                    con.execute("DELETE FROM folders")
+                    con.execute("DELETE FROM sizes")
+                    con.execute(
+                        "INSERT OR REPLACE INTO meta VALUES ('namespace_id', ?)",
+                        (namespace_id,),
+                    )
+        except sqlite3.Error:
+            pass
+
+    def clear(self):
+        """Removes all cached listings and sizes."""
+        try:
+            with self._lock, self._connection() as con:
+                con.execute("DELETE FROM folders")
+                con.execute("DELETE FROM sizes")
+        except sqlite3.Error:
+            pass
+
+    def close(self):
+        """
+        Closes the database connection. All further calls behave as if the cache was
+        empty and no longer store anything.
+        """
+        with self._lock:
+            self._closed = True
+            if self._con:
+                self._con.close()
+                self._con = None
@@ -41,17 +41,16 @@ from maestral.exceptions import (
 )
 
 # local imports
+# windows and dialogs are imported when first shown to speed up startup
 from . import __url__
-from .setup_dialog import SetupDialog
-from .relink_dialog import RelinkDialog
-from .dropbox_location_dialog import DropboxLocationDialog
-from .settings_window import SettingsWindow
-from .activity_window import ActivityWindow
-from .sync_issues_window import SyncIssueWindow
 from .resources import system_tray_icon, APP_ICON_PATH
+from .proxy import CachedMaestralProxy
+from .tracing import tracer
 from .utils import (
     BackgroundTask,
+    CoroutineTask,
     MaestralBackgroundTask,
+    TaskExecutor,
     elide_string,
     markup_urls,
     IS_MACOS,
@@ -97,7 +96,7 @@ class MaestralGuiApp(QtWidgets.QSystemTrayIcon):
         self._n_sync_errors = None
         self._current_icon = None
 
-        self.settings_window = None
+        self._settings_window = None
         self.sync_issues_window = None
         self.rebuild_dialog = None
         self._progress_dialog = None
@@ -136,9 +135,20 @@ class MaestralGuiApp(QtWidgets.QSystemTrayIcon):
             config_name=self.config_name,
             target="status_change_longpoll",
             autostart=False,
+            priority_class=TaskExecutor.STREAM,
         )
         self._wait_for_status.sig_result.connect(self.update_ui)
 
+    @property
+    def settings_window(self):
+        """The settings window, created on first use."""
+        if self._settings_window is None:
+            from .settings_window import SettingsWindow
+
+            self._settings_window = SettingsWindow(self, self.mdbx)
+
+        return self._settings_window
+
     def setIcon(self, icon_name):
         icon = self.icons.get(icon_name, self.icons[SYNCING])
         if self._current_icon != icon_name:
@@ -155,6 +165,9 @@ class MaestralGuiApp(QtWidgets.QSystemTrayIcon):
 
     def update_ui(self):
         if self.loading_done:
+            # the status change may come with changes to any state or config value
+            self.mdbx.invalidate()
+
             try:
                 self.update_status()
                 self.update_error()
@@ -169,6 +182,7 @@ class MaestralGuiApp(QtWidgets.QSystemTrayIcon):
         if self.isSystemTrayAvailable():
             super().setIcon(self.icon())  # reload icon
             self.show()
+            tracer.mark("tray icon shown")
         else:
             QtCore.QTimer.singleShot(1000, self.show_when_systray_available)
 
@@ -193,7 +207,7 @@ class MaestralGuiApp(QtWidgets.QSystemTrayIcon):
         elif start_result == Start.Ok:
             self._started = True
 
-        self.mdbx = MaestralProxy(self.config_name)
+        self.mdbx = CachedMaestralProxy(MaestralProxy(self.config_name))
 
         try:
             pending_link = self.mdbx.pending_link
@@ -204,6 +218,8 @@ class MaestralGuiApp(QtWidgets.QSystemTrayIcon):
         pending_folder = self.mdbx.pending_dropbox_folder
 
         if pending_link or pending_folder:
+            from .setup_dialog import SetupDialog
+
             self.loading_done = SetupDialog.configureMaestral(self.mdbx)
         else:
             self.loading_done = True
@@ -244,9 +260,6 @@ class MaestralGuiApp(QtWidgets.QSystemTrayIcon):
         quitAction.triggered.connect(self.quit)
 
     def setup_ui_linked(self):
-        self.autostart = None
-        self.settings_window = SettingsWindow(self, self.mdbx)
-
         self.setToolTip(IDLE)
 
         # ------------- populate context menu -------------------
@@ -333,6 +346,14 @@ class MaestralGuiApp(QtWidgets.QSystemTrayIcon):
         # ------------ subscribe to status updates --------------
         self._wait_for_status.start()
 
+        # ------- create settings window after startup ---------
+        QtCore.QTimer.singleShot(5000, self._prepare_settings_window)
+
+        tracer.mark("linked UI set up")
+
+    def _prepare_settings_window(self):
+        self.settings_window.selective_sync_dialog.prewarm()
+
     # callbacks for user interaction
 
     def auto_check_for_updates(self):
@@ -342,20 +363,34 @@ class MaestralGuiApp(QtWidgets.QSystemTrayIcon):
             return
         elif time.time() - last_update_check > interval:
             checker = MaestralBackgroundTask(
-                self, self.mdbx.config_name, "check_for_updates"
+                self,
+                self.mdbx.config_name,
+                "check_for_updates",
+                priority_class=TaskExecutor.BACKGROUND,
+                coalesce=True,
             )
             checker.sig_result.connect(self._notify_updates_auto)
 
     def on_check_for_updates_clicked(self):
+        coro_task = CoroutineTask(self._check_for_updates_user_requested(), parent=self)
+        coro_task.sig_done.connect(coro_task.deleteLater)
+
+    async def _check_for_updates_user_requested(self):
         checker = MaestralBackgroundTask(
-            self, self.mdbx.config_name, "check_for_updates"
+            self, self.mdbx.config_name, "check_for_updates", coalesce=True
         )
-        self._progress_dialog = BackgroundTaskProgressDialog("Checking for Updates")
-        self._progress_dialog.show()
-        self._progress_dialog.rejected.connect(checker.sig_result.disconnect)
+        # a later click replaces self._progress_dialog, close our own dialog
+        progress_dialog = BackgroundTaskProgressDialog("Checking for Updates")
+        self._progress_dialog = progress_dialog
+        progress_dialog.show()
+        progress_dialog.rejected.connect(checker.cancel)
 
-        checker.sig_result.connect(self._progress_dialog.accept)
-        checker.sig_result.connect(self._notify_updates_user_requested)
+        res = await checker  # raises TaskCancelledError if the dialog is cancelled
+
+        progress_dialog.accept()
+
+        if res is not None:
+            self._notify_updates_user_requested(res)
 
     def _notify_updates_user_requested(self, res):
         if isinstance(res, UpdateCheckError):
@@ -406,6 +441,8 @@ class MaestralGuiApp(QtWidgets.QSystemTrayIcon):
         self.settings_window.activateWindow()
 
     def on_sync_issues_clicked(self):
+        from .sync_issues_window import SyncIssueWindow
+
         self.sync_issues_window = SyncIssueWindow(self.mdbx)
         self.sync_issues_window.show()
         self.sync_issues_window.raise_()
@@ -413,6 +450,8 @@ class MaestralGuiApp(QtWidgets.QSystemTrayIcon):
         self.sync_issues_window.setAttribute(QtCore.Qt.WidgetAttribute.WA_DeleteOnClose)
 
     def on_activity_clicked(self):
+        from .activity_window import ActivityWindow
+
         self.activity_window = ActivityWindow(self.mdbx)
         self.activity_window.show()
         self.activity_window.raise_()
@@ -460,6 +499,12 @@ class MaestralGuiApp(QtWidgets.QSystemTrayIcon):
         status = self.mdbx.status
         is_paused = self.mdbx.paused
 
+        if self.mdbx.is_stale("status"):
+            # the daemon did not respond in time, the last known status is shown
+            status_text = f"{status} (not responding)"
+        else:
+            status_text = status
+
         # update icon
         if has_sync_issues and status == IDLE:
             new_icon = SYNC_ERROR
@@ -482,11 +527,11 @@ class MaestralGuiApp(QtWidgets.QSystemTrayIcon):
             self.accountUsageAction.setText(self.mdbx.get_state("account", "usage"))
             self.accountEmailAction.setText(self.mdbx.get_state("account", "email"))
 
-            status_short = elide_string(status)
+            status_short = elide_string(status_text)
             self.statusAction.setText(status_short)
 
         # update tooltip
-        self.setToolTip(status)
+        self.setToolTip(status_text)
 
         # cache _n_errors
         self._n_sync_errors = n_sync_errors
@@ -511,12 +556,15 @@ class MaestralGuiApp(QtWidgets.QSystemTrayIcon):
 
         if isinstance(err, NoDropboxDirError):
             # Show location dialog dialog.
+            from .dropbox_location_dialog import DropboxLocationDialog
+
             self._dbx_location_dialog = DropboxLocationDialog(self.mdbx)
             self._dbx_location_dialog.show()
             self._dbx_location_dialog.raise_()
 
         elif isinstance(err, (TokenRevokedError, TokenExpiredError)):
             # Show relink dialog.
+            from .relink_dialog import RelinkDialog
 
             if isinstance(err, TokenExpiredError):
                 reason = RelinkDialog.REVOKED
@@ -602,10 +650,14 @@ def run(config_name, start_result: Start):
     :param config_name: Name of Maestral config to run.
     :param start_result: Result from starting the sync daemon.
     """
+    tracer.mark("run")
+
     app = QtWidgets.QApplication(["Maestral"])
     app.setWindowIcon(QtGui.QIcon(APP_ICON_PATH))
     app.setQuitOnLastWindowClosed(False)
 
     maestral_gui = MaestralGuiApp(config_name)
+    tracer.mark("app constructed")
+
     maestral_gui.load_maestral(start_result)
     sys.exit(app.exec())
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+# system imports
+import os
+import re
+from bisect import bisect_left
+
+
+_token_re = re.compile(r"[^\W_]+")
+
+
+def tokenize(text):
+    """
+    Splits a name or search query into lower-case words. Punctuation, whitespace and
+    underscores separate words.
+
+    :param str text: Name or query.
+    :returns: Set of words.
+    :rtype: set[str]
+    """
+    return set(_token_re.findall(text.lower()))
+
+
+class NameIndex:
+    """
+    An index of Dropbox paths by the words in their names. Paths are added as folder
+    listings arrive, such that the index grows with the loaded part of the tree.
+
+    A search matches all paths whose names contain, for every word of the query, a
+    word which starts with it. Words are kept in a sorted list to look up prefixes by
+    bisection. New words are merged into the list on the next search.
+    """
+
+    def __init__(self):
+        self._paths = {}  # word -> list of paths
+        self._words = []  # sorted words
+        self._newWords = []  # words which are not yet in the sorted list
+        self._indexed = set()
+
+    def __len__(self):
+        return len(self._indexed)
+
+    def add(self, entries):
+        """
+        Adds entries to the index. Entries which are already indexed are skipped.
+
+        :param entries: Iterable of :class:`maestral_qt.listing_cache.FolderEntry`.
+        """
+        for entry in entries:
+            path = entry.path_lower
+
+            if path in self._indexed:
+                continue
+
+            self._indexed.add(path)
+
+            for word in tokenize(os.path.basename(path)):
+                try:
+                    self._paths[word].append(path)
+                except KeyError:
+                    self._paths[word] = [path]
+                    self._newWords.append(word)
+
+    def discard(self, path):
+        """
+        Removes a path from the index, for instance when it was deleted.
+
+        :param str path: Normalized Dropbox path.
+        """
+        if path not in self._indexed:
+            return
+
+        self._indexed.discard(path)
+
+        for word in tokenize(os.path.basename(path)):
+            paths = self._paths.get(word)
+            if paths and path in paths:
+                paths.remove(path)
+
+    def search(self, query):
+        """
+        Returns all indexed paths which match a query.
+
+        :param str query: Words to search for.
+        :returns: Set of normalized Dropbox paths.
+        :rtype: set[str]
+        """
+        if self._newWords:
+            # Both lists are sorted runs which are merged in linear time.
+            self._newWords.sort()
+            self._words.extend(self._newWords)
+            self._words.sort()
+            self._newWords = []
+
+        matches = None
+
+        for prefix in tokenize(query):
+            paths = set()
+            i = bisect_left(self._words, prefix)
+
+            while i < len(self._words) and self._words[i].startswith(prefix):
+                paths.update(self._paths[self._words[i]])
+                i += 1
+
+            matches = paths if matches is None else matches & paths
+
+            if not matches:
+                break
+
+        return matches or set()
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+# system imports
+import time
+import copy
+from collections import Counter
+
+# external imports
+from Pyro5.client import Proxy
+from Pyro5.errors import TimeoutError as PyroTimeoutError
+
+
+class CachedMaestralProxy:
+    """
+    A wrapper around :class:`maestral.daemon.MaestralProxy` which caches reads of config
+    values, state values and properties. Each cached value expires after the time to
+    live of its method or property in :attr:`TTL`, ``None`` meaning that it never
+    expires and zero that it is read from the daemon every time. All other attributes
+    are passed through to the proxy.
+
+    The whole cache is invalidated when a property is set or a method in
+    :attr:`MODIFYING` is called, since those may change any config or state value,
+    and by :meth:`invalidate`, for instance when the daemon reports a status change or
+    a :class:`maestral_qt.utils.MaestralBackgroundTask` has modified the daemon over
+    its own connection.
+    Values which are read to be modified and written back, such as the excluded
+    items, are never cached.
+
+    Reads from the daemon time out after :attr:`TIMEOUT` seconds, for instance when
+    the daemon is busy indexing. The last known value is then returned instead and
+    marked as stale, see :meth:`is_stale`. Further reads return their last known
+    value without asking the daemon until a backoff delay has passed, which doubles
+    with each timeout up to :attr:`MAX_BACKOFF`. Reads without a known value wait for
+    the daemon as long as it takes. Values which are not in :attr:`TTL`, such as the
+    excluded items, are never stale and stale values are never written back.
+
+    :param proxy: Proxy to wrap.
+    :param dict[str, float | None] ttl: Times to live which replace the defaults.
+    """
+
+    # times to live in seconds, by method or property
+    TTL = {
+        "config_name": None,
+        "get_conf": 30,
+        "get_state": 30,
+        "dropbox_path": 60,
+        "notification_level": 60,
+        "notification_snooze": 10,
+        "bandwidth_limit_up": 60,
+        "bandwidth_limit_down": 60,
+        "account_profile_pic_path": 60,
+        "paused": 5,
+        "status": 0,
+        "sync_errors": 0,
+    }
+
+    # methods which may change config or state values
+    MODIFYING = frozenset(
+        (
+            "set_conf",
+            "set_state",
+            "unlink",
+            "start_sync",
+            "stop_sync",
+            "reset_sync_state",
+            "rebuild_index",
+            "create_dropbox_directory",
+            "exclude_item",
+            "include_item",
+            "clear_fatal_errors",
+        )
+    )
+
+    # timeout of reads in seconds, by method or property
+    TIMEOUT = {"sync_errors": 5}
+    DEFAULT_TIMEOUT = 2
+
+    # delays in seconds before the daemon is asked again after a read timed out
+    MIN_BACKOFF = 5
+    MAX_BACKOFF = 120
+
+    def __init__(self, proxy, ttl=None):
+        self._proxy = proxy
+        self._ttl = dict(self.TTL, **(ttl or {}))
+        self._values = {}  # (name, *args) -> last known value
+        self._expiry = {}  # (name, *args) -> time after which the value is refetched
+        self._stale = set()
+        self._backoff = 0
+        self._retry_time = 0
+        self._hits = Counter()
+        self._misses = Counter()
+
+    @property
+    def hits(self):
+        """Number of reads served from the cache, by method or property.
+
+        :rtype: dict[str, int]
+        """
+        return dict(self._hits)
+
+    @property
+    def misses(self):
+        """Number of reads passed on to the daemon, by method or property.
+
+        :rtype: dict[str, int]
+        """
+        return dict(self._misses)
+
+    def invalidate(self):
+        """Expires all cached values. Last known values are kept in case the daemon
+        does not respond in time."""
+        self._expiry.clear()
+
+    def is_stale(self, name, *args):
+        """
+        Whether the last read of a method or property returned a stale value because
+        the daemon did not respond in time.
+
+        :param str name: Name of the method or property.
+        :param args: Arguments of the method.
+        :rtype: bool
+        """
+        return (name,) + args in self._stale
+
+    def get_conf(self, section, name):
+        return self._cached("get_conf", section, name)
+
+    def get_state(self, section, name):
+        return self._cached("get_state", section, name)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        if name in self._ttl:
+            return self._cached(name)
+
+        value = getattr(self._proxy, name)
+
+        if name in self.MODIFYING:
+            return self._invalidating(value)
+
+        return value
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            super().__setattr__(name, value)
+        else:
+            self.invalidate()
+            setattr(self._proxy, name, value)
+
+    def _invalidating(self, method):
+        def wrapper(*args, **kwargs):
+            self.invalidate()
+            return method(*args, **kwargs)
+
+        return wrapper
+
+    def _cached(self, name, *args):
+        key = (name,) + args
+        now = time.monotonic()
+        expiry = self._expiry.get(key, 0)
+
+        if expiry is None or now < expiry:
+            self._hits[name] += 1
+            return copy.copy(self._values[key])
+
+        if key in self._values and now < self._retry_time:
+            # the daemon did not respond recently, don't wait for it again
+            self._hits[name] += 1
+            self._stale.add(key)
+            return copy.copy(self._values[key])
+
+        self._misses[name] += 1
+
+        if key in self._values:
+            timeout = self.TIMEOUT.get(name, self.DEFAULT_TIMEOUT)
+        else:
+            timeout = None
+
+        try:
+            value = self._read(name, args, timeout)
+        except PyroTimeoutError:
+            self._backoff = min(
+                max(2 * self._backoff, self.MIN_BACKOFF), self.MAX_BACKOFF
+            )
+            self._retry_time = time.monotonic() + self._backoff
+            self._stale.add(key)
+            return copy.copy(self._values[key])
+
+        self._backoff = 0
+        self._stale.discard(key)
+
+        ttl = self._ttl[name]
+        self._values[key] = value
+        self._expiry[key] = None if ttl is None else now + ttl
+
+        # callers must not modify cached lists or dicts
+        return copy.copy(value)
+
+    def _read(self, name, args, timeout):
+        pyro_proxy = getattr(self._proxy, "_m", None)
+
+        if not isinstance(pyro_proxy, Proxy):
+            # Maestral runs in our process, calls cannot time out
+            pyro_proxy = None
+        elif timeout is not None:
+            default_timeout = pyro_proxy._pyroTimeout
+            pyro_proxy._pyroTimeout = timeout
+
+        try:
+            if args:
+                return getattr(self._proxy, name)(*args)
+            else:
+                return getattr(self._proxy, name)
+        finally:
+            if pyro_proxy is not None and timeout is not None:
+                pyro_proxy._pyroTimeout = default_timeout
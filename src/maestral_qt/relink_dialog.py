@@ -128,6 +128,8 @@ class RelinkDialog(QtWidgets.QDialog, Ui_RelinkDialog):
         self.auth_task.sig_result.connect(self.on_link_done)
 
     def on_link_done(self, res):
+        self.mdbx.invalidate()
+
         if res == 0:
             self.lineEditAuthCode.setPlaceholderText(self.VALID_MSG)
             QtWidgets.QApplication.processEvents()
@@ -53,9 +53,14 @@ class Ui_SelectiveSyncDialog(object):
         self.label.setWordWrap(True)
         self.label.setObjectName("label")
         self.gridLayout.addWidget(self.label, 0, 1, 1, 3)
+        self.searchLineEdit = QtWidgets.QLineEdit(SelectiveSyncDialog)
+        self.searchLineEdit.setClearButtonEnabled(True)
+        self.searchLineEdit.setObjectName("searchLineEdit")
+        self.gridLayout.addWidget(self.searchLineEdit, 1, 1, 1, 3)
 
         self.retranslateUi(SelectiveSyncDialog)
         QtCore.QMetaObject.connectSlotsByName(SelectiveSyncDialog)
+        SelectiveSyncDialog.setTabOrder(self.searchLineEdit, self.treeViewFolders)
 
     def retranslateUi(self, SelectiveSyncDialog):
         _translate = QtCore.QCoreApplication.translate
@@ -64,3 +69,4 @@ class Ui_SelectiveSyncDialog(object):
         self.selectAllCheckBox.setText(_translate("SelectiveSyncDialog", "Select all"))
         self.cancelButton.setText(_translate("SelectiveSyncDialog", "Cancel"))
         self.label.setText(_translate("SelectiveSyncDialog", "Select which files and folders you want to see on your computer. Any items you unselect won\'t be shown on this computer, but you can still access them on the Dropbox website."))
+        self.searchLineEdit.setPlaceholderText(_translate("SelectiveSyncDialog", "Search"))
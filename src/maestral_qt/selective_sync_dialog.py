@@ -2,22 +2,29 @@
 
 # system imports
 import os
+import heapq
+import itertools
 import threading
+import time
+from functools import partial
+from operator import attrgetter
 from queue import Queue
 
 # external packages
-from PyQt6 import QtCore, QtWidgets, QtGui
+from PyQt6 import QtCore, QtWidgets
 from PyQt6.QtCore import QAbstractItemModel, QModelIndex, Qt
 from PyQt6.QtCore import pyqtSignal as Signal
 
 # maestral modules
 from maestral.daemon import MaestralProxy
 from maestral.exceptions import NotAFolderError, NotFoundError, BusyError
+from maestral.utils import natural_size
 from maestral.utils.path import is_child, is_equal_or_child
-from maestral.core import FolderMetadata
 
 # local imports
-from .utils import BackgroundTask
+from .utils import BackgroundTask, TaskExecutor
+from .listing_cache import ListingCache, entry_from_metadata, self_and_ancestors
+from .name_index import NameIndex, tokenize
 from .widgets import UserDialog
 from .resources import native_folder_icon, native_file_icon
 from .resources.ui_selective_sync_dialog import Ui_SelectiveSyncDialog
@@ -35,31 +42,120 @@ class FileSystemModel(QAbstractItemModel):
     def __init__(self, root, parent=None, checkbox_column=1):
         super().__init__(parent=parent)
         self._root_item = root
-        self._root_item.loading_done.connect(self.reloadData)
-        self._root_item.loading_failed.connect(self.on_loading_failed)
+        self._root_item.notifier.children_about_to_change.connect(
+            self.on_children_about_to_change
+        )
+        self._root_item.notifier.loading_done.connect(self.on_loading_done)
+        self._root_item.notifier.loading_failed.connect(self.on_loading_failed)
         self._header = self._root_item.header()
         self._flags = Qt.ItemFlag.ItemIsUserCheckable
         self.checkbox_column = checkbox_column
+        self._persistentItems = []
+
+        # accepted children of items when filtering, and the rows of accepted items
+        self._rowFilter = None
+        self._filteredChildren = {}
+        self._filteredRows = {}
+
+    def on_children_about_to_change(self, item=None):
+        self.layoutAboutToBeChanged.emit()
+        self._snapshotPersistentIndexes()
+
+    def on_loading_done(self, item=None):
+        self._invalidateFilter(item)
+        self._updatePersistentIndexes()
+        self.layoutChanged.emit()
+        self.loading_done.emit()
 
-    def on_loading_failed(self):
+    def on_loading_failed(self, item=None):
         self.display_message(
             "Could not connect to Dropbox. Please check your internet connection."
         )
 
     def display_message(self, message):
-        self._root_item._children = [MessageTreeItem(self._root_item, message=message)]
+        self.beginResetModel()
+        self._root_item._setChildren(
+            [MessageTreeItem(self._root_item, message=message)]
+        )
+        self._invalidateFilter()
+        self.endResetModel()
 
         self.loading_failed.emit()
-        self.modelReset.emit()
 
     def reloadData(self, roles=None):
         if not roles:
             roles = [Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.CheckStateRole]
 
+        if Qt.ItemDataRole.DecorationRole in roles:
+            # drop shared icons so that they are reloaded, e.g., after a theme change
+            _icon_cache.clear()
+
         self.dataChanged.emit(QModelIndex(), QModelIndex(), roles)
         self.layoutChanged.emit()
         self.loading_done.emit()
 
+    def refresh(self):
+        """Redraws all items without changing the layout, for instance when values
+        which are computed in the background have changed. Views redraw all visible
+        items when multiple top-level items change."""
+        n_rows = self.rowCount()
+        if n_rows > 0:
+            first = self.index(0, 0, QModelIndex())
+            last = self.index(n_rows - 1, self.columnCount() - 1, QModelIndex())
+            self.dataChanged.emit(first, last, [Qt.ItemDataRole.DisplayRole])
+
+    def setRowFilter(self, accepts):
+        """
+        Only shows items which are accepted by the given function. Items which are not
+        accepted are hidden together with their descendants. The filter is applied
+        lazily, to the children of items which are requested by a view.
+
+        :param accepts: Function which is called with a tree item and returns whether
+            the item is shown, or None to show all items.
+        """
+        self.layoutAboutToBeChanged.emit()
+        self._snapshotPersistentIndexes()
+        self._rowFilter = accepts
+        self._invalidateFilter()
+        self._updatePersistentIndexes()
+        self.layoutChanged.emit()
+
+    def isFiltered(self):
+        """Whether a row filter is set."""
+        return self._rowFilter is not None
+
+    def _invalidateFilter(self, item=None):
+        if item is None:
+            self._filteredChildren.clear()
+            self._filteredRows.clear()
+        else:
+            for child in self._filteredChildren.pop(item, ()):
+                self._filteredRows.pop(child, None)
+
+    def _childrenOf(self, item):
+        if self._rowFilter is None:
+            return item.children_()
+
+        try:
+            return self._filteredChildren[item]
+        except KeyError:
+            children = [c for c in item.children_() if self._rowFilter(c)]
+            self._filteredChildren[item] = children
+            for row, child in enumerate(children):
+                self._filteredRows[child] = row
+            return children
+
+    def _rowOf(self, item):
+        row = item.row()
+
+        if self._rowFilter is None or row < 0 or not item.parent_():
+            return row
+
+        if item not in self._filteredRows:
+            self._childrenOf(item.parent_())
+
+        return self._filteredRows.get(item, -1)
+
     def flags(self, index):
         flags = super().flags(index) | self._flags
         return flags
@@ -77,7 +173,7 @@ class FileSystemModel(QAbstractItemModel):
             parent_item = self._root_item
         else:
             parent_item = parent.internalPointer()
-        return parent_item.child_count()
+        return len(self._childrenOf(parent_item))
 
     def hasChildren(self, parent=None):
         if parent and parent.isValid():
@@ -100,6 +196,50 @@ class FileSystemModel(QAbstractItemModel):
             return True
         return False
 
+    def setChildrenCheckState(self, parent, value):
+        """Sets the check state of all loaded children of the given index at once, for
+        instance to select or deselect all items."""
+        if parent.isValid():
+            item = parent.internalPointer()
+        else:
+            item = self._root_item
+
+        item.setChildrenCheckState(value)
+
+        n_rows = item.child_count_loaded()
+        if n_rows > 0 and self._rowFilter is not None:
+            n_rows = len(self._childrenOf(item))
+        if n_rows > 0:
+            first = self.index(0, self.checkbox_column, parent)
+            last = self.index(n_rows - 1, self.checkbox_column, parent)
+            self.dataChanged.emit(first, last)
+        self.layoutChanged.emit()
+
+    def fetchMoreChildren(self, parent):
+        """
+        Lists further children of the given index if its listing is paused. Views call
+        this once the last loaded child is scrolled into view. Qt's fetchMore is not
+        implemented since views call it on every layout, whether or not the last child
+        is visible.
+        """
+        if parent.isValid():
+            item = parent.internalPointer()
+        else:
+            item = self._root_item
+
+        if item.canFetchMore():
+            item.fetchMore()
+
+    def cancelLoading(self, index):
+        """Cancels loading the children of an item, for instance when it is
+        collapsed."""
+        if index.isValid():
+            index.internalPointer().cancelLoading()
+
+    def isSelectionModified(self):
+        """Whether the check state of any item differs from its original state."""
+        return self._root_item.notifier.n_modified > 0
+
     def setData(self, index, value, role):
         if (
             role == Qt.ItemDataRole.CheckStateRole
@@ -121,17 +261,20 @@ class FileSystemModel(QAbstractItemModel):
             return item.checkState
         if role == Qt.ItemDataRole.DecorationRole and column == 0:
             return item.icon
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return item.toolTip(column)
         return None
 
     def headerData(self, column, orientation, role):
-        if (
-            orientation == Qt.Orientation.Horizontal
-            and role == Qt.ItemDataRole.DisplayRole
-        ):
+        if orientation != Qt.Orientation.Horizontal:
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
             try:
                 return self._header[column]
             except IndexError:
                 pass
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return self._root_item.headerToolTip(column)
         return None
 
     def index(self, row, column, parent):
@@ -141,7 +284,7 @@ class FileSystemModel(QAbstractItemModel):
             parent_item = self._root_item
         else:
             parent_item = parent.internalPointer()
-        child_item = parent_item.child_at(row)
+        child_item = self._childrenOf(parent_item)[row]
         if child_item:
             return self.createIndex(row, column, child_item)
         else:
@@ -156,38 +299,132 @@ class FileSystemModel(QAbstractItemModel):
         parent_item = child_item.parent_()
         if parent_item == self._root_item:
             return QModelIndex()
-        return self.createIndex(parent_item.row(), 0, parent_item)
+        return self.createIndex(self._rowOf(parent_item), 0, parent_item)
 
     def sort(self, column, order):
+        notifier = self._root_item.notifier
+        notifier.sort_column = column
+        notifier.sort_order = order
+
         self.layoutAboutToBeChanged.emit()
-        self._root_item.sort(column, order)
-        self.dataChanged.emit(QModelIndex(), QModelIndex())
+        self._snapshotPersistentIndexes()
+
+        # Only sort the root and items which are referenced by a view, for instance
+        # because they are expanded or selected. All other items will sort their
+        # children when they are first requested.
+        items = {self._root_item}
+        for _, item in self._persistentItems:
+            items.add(item)
+            if item.parent_():
+                items.add(item.parent_())
+
+        for item in items:
+            item.sort(column, order)
+
+        self._invalidateFilter()
+        self._updatePersistentIndexes()
         self.layoutChanged.emit()
 
+    def _snapshotPersistentIndexes(self):
+        # Persistent indexes only hold a raw pointer to their item. Keep a reference
+        # to each item until the layout change is done, otherwise removed items may be
+        # freed while still referenced.
+        self._persistentItems = [
+            (index, index.internalPointer()) for index in self.persistentIndexList()
+        ]
+
+    def _updatePersistentIndexes(self):
+        # Items cache their row. Update persistent indexes held by views to point to
+        # the new rows of their items after children have been inserted or reordered.
+        old_indexes = []
+        new_indexes = []
+
+        for index, item in self._persistentItems:
+            old_indexes.append(index)
+            row = self._rowOf(item)
+            if row < 0:
+                new_indexes.append(QModelIndex())
+            else:
+                new_indexes.append(self.createIndex(row, index.column(), item))
+
+        self._persistentItems = []
+        self.changePersistentIndexList(old_indexes, new_indexes)
+
 
-class AbstractTreeItem(QtCore.QObject):
+class TreeItemNotifier(QtCore.QObject):
+    """
+    Routes notifications from tree items to the model and holds state shared by the
+    entire tree, such as the current sort order. A single instance is shared by a root
+    item and all its descendants so that tree items themselves do not need to be
+    QObjects.
+    """
+
+    children_about_to_change = Signal(object)
+    loading_done = Signal(object)
+    loading_failed = Signal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent=parent)
+        self.sort_column = 0
+        self.sort_order = Qt.SortOrder.AscendingOrder
+        # number of items whose check state differs from their original state
+        self.n_modified = 0
+
+
+class AbstractTreeItem:
     """
     An abstract item for `TreeModel`. To be subclassed depending on the application.
     """
 
-    loading_done = Signal()
-    loading_failed = Signal()
+    __slots__ = (
+        "_parent",
+        "_children",
+        "_notifier",
+        "_children_update_started",
+        "_checkState",
+        "_checkStateChanged",
+        "_originalCheckState",
+        "_row",
+        "_rowsDirty",
+        "_sortedBy",
+        "_nChecked",
+        "_nPartial",
+        "_nUnchecked",
+        "__weakref__",  # required to connect Qt signals to bound methods
+    )
+
+    can_have_children = True
 
     def __init__(self, parent=None):
-        QtCore.QObject.__init__(self, parent=parent)
         self._children = []
         self._parent = parent
         self._children_update_started = False
-        self._children_update_completed = False
         self._checkStateChanged = False
+        self._row = 0
+        self._rowsDirty = False
 
         if self._parent:
-            self.loading_done.connect(self._parent.loading_done)
-            self.loading_failed.connect(self._parent.loading_failed)
+            self._notifier = self._parent._notifier
+        else:
+            self._notifier = TreeItemNotifier()
 
-        self.icon = QtGui.QIcon()
+        self._sortedBy = (self._notifier.sort_column, self._notifier.sort_order)
         self._checkState = 0
-        self.can_have_children = True
+        self._originalCheckState = 0
+
+        # number of loaded children in each check state
+        self._nChecked = 0
+        self._nPartial = 0
+        self._nUnchecked = 0
+
+    @property
+    def notifier(self):
+        """The :class:`TreeItemNotifier` shared by all items in this tree."""
+        return self._notifier
+
+    @property
+    def icon(self):
+        return None
 
     @property
     def checkState(self):
@@ -196,21 +433,69 @@ class AbstractTreeItem(QtCore.QObject):
     @checkState.setter
     def checkState(self, state):
         self._checkStateChanged = True
-        self._checkState = state
+        self._assignCheckState(state)
 
         self._checkStatePropagateToChildren(state)
         self._checkStatePropagateToParent(state)
 
+    def _assignCheckState(self, state):
+        # Sets the check state without propagation and keeps our parent's child
+        # counters up to date. Returns whether the state was changed.
+        old_state = self._checkState
+        if old_state == state:
+            return False
+
+        self._checkState = state
+        self._countModified(old_state, state)
+
+        if self._parent:
+            self._parent._countChildState(old_state, -1)
+            self._parent._countChildState(state, 1)
+
+        return True
+
+    def _countModified(self, old_state, new_state):
+        # update the tree-wide count of items which differ from their original state
+        was_modified = old_state != self._originalCheckState
+        is_modified = new_state != self._originalCheckState
+
+        if is_modified and not was_modified:
+            self._notifier.n_modified += 1
+        elif was_modified and not is_modified:
+            self._notifier.n_modified -= 1
+
+    def _countChildState(self, state, n):
+        if state == 0:
+            self._nUnchecked += n
+        elif state == 1:
+            self._nPartial += n
+        elif state == 2:
+            self._nChecked += n
+
     def _checkStatePropagateToChildren(self, state):
         pass
 
     def _checkStatePropagateToParent(self, state):
         pass
 
+    def setChildrenCheckState(self, state):
+        """Sets the check state of all loaded children."""
+        pass
+
+    def allChildrenChecked(self):
+        """Whether all loaded children are checked."""
+        return self._nChecked == self.child_count_loaded()
+
     def header(self):
         # subclass this
         raise NotImplementedError(self.header)
 
+    def headerToolTip(self, column):
+        return None
+
+    def toolTip(self, column):
+        return None
+
     def column_count(self):
         return len(self.header())
 
@@ -223,15 +508,63 @@ class AbstractTreeItem(QtCore.QObject):
     def _create_children_async(self):
         raise NotImplementedError(self._create_children_async)
 
+    def cancelLoading(self):
+        """Cancels loading of children, for instance when the item is collapsed."""
+        pass
+
+    def canFetchMore(self):
+        """Whether more children can be loaded on request."""
+        return False
+
+    def fetchMore(self):
+        """Loads more children."""
+        pass
+
     def row(self):
-        if self._parent:
-            return self._parent._children.index(self)
-        return 0
+        """The row of this item in its parent or -1 if it has been removed."""
+        if self._parent and self._parent._rowsDirty:
+            self._parent._reindexChildren()
+        return self._row
+
+    def _reindexChildren(self):
+        for row, child in enumerate(self._children):
+            child._row = row
+        self._rowsDirty = False
+
+    def _setChildren(self, children):
+        kept = {id(child) for child in children}
+
+        for child in self._children:
+            child._row = -1
+            self._countChildState(child._checkState, -1)
+            if id(child) not in kept:
+                self._notifier.n_modified -= child._nModifiedInSubtree()
+
+        for child in children:
+            self._countChildState(child._checkState, 1)
+
+        self._children = children
+        self._rowsDirty = True
+
+    def _nModifiedInSubtree(self):
+        n_modified = 0
+        stack = [self]
+
+        while stack:
+            item = stack.pop()
+            if item._checkState != item._originalCheckState:
+                n_modified += 1
+            stack.extend(item._children)
+
+        return n_modified
 
     def children_(self):
         if not self._children_update_started:
             self._create_children_async()
             self._children_update_started = True
+        if self._sortedBy != (self._notifier.sort_column, self._notifier.sort_order):
+            # apply a sort order which was changed while our children were not shown
+            self.sort(self._notifier.sort_column, self._notifier.sort_order)
         return self._children
 
     def child_at(self, row):
@@ -253,18 +586,22 @@ class AbstractTreeItem(QtCore.QObject):
         return False
 
     def sort(self, column, order):
-        pass
+        """Sorts the children of this item. This does not recurse into descendants."""
+        self._sortedBy = (column, order)
 
 
 class MessageTreeItem(AbstractTreeItem):
     """A tree item to display a message instead of contents."""
 
+    __slots__ = ("_message",)
+
+    can_have_children = False
+
     def __init__(self, parent=None, message=""):
         AbstractTreeItem.__init__(self, parent=parent)
-        self._parent = parent
         self._message = message
         self._checkState = None
-        self.can_have_children = False
+        self._originalCheckState = None
 
     def _async_loading_done(self, result):
         pass
@@ -276,31 +613,74 @@ class MessageTreeItem(AbstractTreeItem):
         return None
 
     def data(self, column):
-        return (self._message, "")[column]
+        return (self._message, "", "")[column]
 
     def header(self):
-        return ["Name", "Included"]
+        return ["Name", "Included", "Size"]
 
 
-def _sort_key(item, column, reverse):
-    if column == 0 and isinstance(item, DropboxPathItem):
-        if item.is_folder is not reverse:
-            prefix = "\x00"
-        else:
-            prefix = ""
+_icon_cache = {}
+
+# folder sizes are only computed when needed to sort by size
+_SIZE_TOOL_TIP = "Sort by size to compute the size of folders."
+
+
+def _cached_icon(is_folder):
+    # Icons are shared between all items instead of creating one QIcon per item.
+    try:
+        return _icon_cache[is_folder]
+    except KeyError:
+        icon = native_folder_icon() if is_folder else native_file_icon()
+        _icon_cache[is_folder] = icon
+        return icon
 
-        return f"{prefix}{item._basename.lower()}"
 
+def _reverse_name_sort_key(item):
+    if item.is_folder:
+        return item._sortKey[1:]
+    else:
+        return f"\x00{item._sortKey}"
+
+
+def _size_sort_key(item):
+    size = item.size
+    return -1 if size is None else size
+
+
+def _sort_key(column, reverse):
+    """Returns a key function to sort items by the given column. When sorting by name,
+    folders are placed before files in either order."""
+    if column == 0:
+        if reverse:
+            return _reverse_name_sort_key
+        else:
+            return attrgetter("_sortKey")
     elif column == 1:
-        return item.checkState
+        return attrgetter("checkState")
+    elif column == 2:
+        return _size_sort_key
     else:
-        return item.data(column)
+        return lambda item: item.data(column)
 
 
 class DropboxPathItem(AbstractTreeItem):
     """A Dropbox folder item. It lists its children asynchronously, only when asked to
     by `TreeModel`."""
 
+    __slots__ = (
+        "is_folder",
+        "_path_display",
+        "_path_lower",
+        "_basename",
+        "_async_loader",
+        "_unchecked",
+        "_remote",
+        "_revalidation",
+        "_pendingEntries",
+        "_sortKey",
+        "_size",
+    )
+
     def __init__(
         self,
         async_loader,
@@ -308,22 +688,25 @@ class DropboxPathItem(AbstractTreeItem):
         path_display="/",
         path_lower="/",
         is_folder=True,
+        size=0,
         parent=None,
     ):
         super().__init__(parent=parent)
         if is_folder:
-            self.icon = native_folder_icon()
             self._children = [MessageTreeItem(self, "Loading...")]
-        else:
-            self.icon = native_file_icon()
-            self._children = []
         self.is_folder = is_folder
-        self.can_have_children = is_folder
         self._path_display = path_display
         self._path_lower = path_lower
         self._basename = os.path.basename(self._path_display)
+        # folders sort before files
+        prefix = "\x00" if is_folder else ""
+        self._sortKey = f"{prefix}{self._basename.lower()}"
+        self._size = size
         self._async_loader = async_loader
         self._unchecked = unchecked
+        self._remote = None
+        self._revalidation = None
+        self._pendingEntries = None
 
         self._checkStateChanged = False
 
@@ -354,67 +737,293 @@ class DropboxPathItem(AbstractTreeItem):
             self._checkStateChanged = False
             self._checkState = int(self._originalCheckState)
 
-    def _create_children_async(self):
+        if self._checkState != self._originalCheckState:
+            self._notifier.n_modified += 1
+
+    @property
+    def icon(self):
+        return _cached_icon(self.is_folder)
+
+    @property
+    def can_have_children(self):
+        return self.is_folder
+
+    @property
+    def size(self):
+        """The size of a file or the total size of a folder's content in bytes. None
+        if the size of a folder is not known yet."""
         if self.is_folder:
+            return self._async_loader.folderSize(self._path_lower)
+        return self._size
+
+    def _create_children_async(self):
+        if not self.is_folder:
+            self._async_loading_done([])
+            return
+
+        cached_entries = self._async_loader.cachedChildren(self._path_lower)
+
+        if cached_entries is None:
             self._remote = self._async_loader.listChildren(self._path_lower)
             self._remote.sig_result.connect(self._async_loading_done)
+            self._remote.sig_done.connect(self._onListingDone)
         else:
-            self._async_loading_done([])
+            # Our children have not been requested by the model before, we can add
+            # cached entries without notifying it. Loading is reported from the event
+            # loop since we are likely called from within a model method.
+            self._removeMessages()
+            self._insertChildren(self._createChildren(cached_entries))
+            QtCore.QTimer.singleShot(0, self._notifyCachedLoadingDone)
+
+            # listings from this session, for instance prefetched ones, are up-to-date
+            if not self._async_loader.isFresh(self._path_lower):
+                self._revalidation = self._async_loader.revalidateChildren(
+                    self._path_lower
+                )
+                self._revalidation.sig_result.connect(self._revalidation_done)
+                self._revalidation.sig_done.connect(self._onRevalidationDone)
+
+    def _onListingDone(self):
+        self._remote = None
+
+    def canFetchMore(self):
+        return self._remote is not None and self._async_loader.isPaused(self._remote)
+
+    def fetchMore(self):
+        if self.canFetchMore():
+            self._async_loader.fetchMore(self._remote)
+
+    def _onRevalidationDone(self):
+        self._revalidation = None
+
+    def cancelLoading(self):
+        # Cancel revalidations of this item and its loaded descendants and listings
+        # which have not loaded any children yet. Those items are reset and will be
+        # listed again when requested. Listings which loaded some children continue,
+        # their items and any changes to their check state are kept.
+        stack = [self]
+
+        while stack:
+            item = stack.pop()
+
+            if item._revalidation:
+                item._revalidation.sig_result.disconnect(item._revalidation_done)
+                item._revalidation.sig_done.disconnect(item._onRevalidationDone)
+                item._async_loader.cancelListing(item._revalidation)
+                item._revalidation = None
+
+            children = [c for c in item._children if isinstance(c, DropboxPathItem)]
+
+            if item._remote and not children:
+                item._remote.sig_result.disconnect(item._async_loading_done)
+                item._remote.sig_done.disconnect(item._onListingDone)
+                item._async_loader.cancelListing(item._remote)
+                item._remote = None
+                item._resetChildren()
+            else:
+                stack.extend(children)
+
+    def _resetChildren(self):
+        self._pendingEntries = None
+        self._notifier.children_about_to_change.emit(self)
+        self._setChildren([MessageTreeItem(self, "Loading...")])
+        self._children_update_started = False
+        self._notifier.loading_done.emit(self)
+
+    def _notifyCachedLoadingDone(self):
+        self._notifier.children_about_to_change.emit(self)
+        self._notifier.loading_done.emit(self)
 
     def _async_loading_done(self, results):
         if isinstance(results, Exception):
             raise results
 
-        for child in self._children.copy():
-            if isinstance(child, MessageTreeItem):
-                self._children.remove(child)
-
         if results is False:
-            self.loading_failed.emit()
+            self._insertPendingEntries()
+            self._removeMessages()
+            self._notifier.loading_failed.emit(self)
         else:
-            new_nodes = [
-                DropboxPathItem(
-                    self._async_loader,
-                    self._unchecked,
-                    path_display=e.path_display,
-                    path_lower=e.path_lower,
-                    is_folder=isinstance(e, FolderMetadata),
-                    parent=self,
-                )
-                for e in results
+            # Collect pages which arrive while the GUI is busy and insert them at once.
+            # The next page is listed meanwhile and the model and view only update
+            # once per batch instead of once per page.
+            if self._pendingEntries is None:
+                self._pendingEntries = []
+                QtCore.QTimer.singleShot(0, self._insertPendingEntries)
+
+            self._pendingEntries.extend(results)
+
+    def _insertPendingEntries(self):
+        if self._pendingEntries is None:
+            return
+
+        entries = self._pendingEntries
+        self._pendingEntries = None
+
+        self._notifier.children_about_to_change.emit(self)
+        self._removeMessages()
+        self._insertChildren(self._createChildren(entries))
+        self._notifier.loading_done.emit(self)
+
+    def _revalidation_done(self, results):
+        if isinstance(results, Exception):
+            raise results
+
+        if results is False:
+            # keep showing cached entries when offline
+            return
+
+        # Only apply the differences to the cached children. Items which are renamed,
+        # change type or change size are replaced.
+        current = {
+            c._path_lower: c for c in self._children if isinstance(c, DropboxPathItem)
+        }
+        new_entries = {e.path_lower: e for e in results}
+
+        removed = set()
+
+        for path_lower, child in current.items():
+            entry = new_entries.get(path_lower)
+            if (
+                not entry
+                or entry.path_display != child._path_display
+                or entry.is_folder != child.is_folder
+                or entry.size != child._size
+            ):
+                removed.add(path_lower)
+
+        added = [
+            e for e in results if e.path_lower not in current or e.path_lower in removed
+        ]
+
+        if not removed and not added:
+            return
+
+        for path_lower in removed:
+            self._async_loader.name_index.discard(path_lower)
+
+        self._notifier.children_about_to_change.emit(self)
+        self._setChildren(
+            [
+                c
+                for c in self._children
+                if not isinstance(c, DropboxPathItem) or c._path_lower not in removed
             ]
-            self._children.extend(new_nodes)
-            self.sort(0, Qt.SortOrder.AscendingOrder)
-            self.loading_done.emit()
+        )
+        self._insertChildren(self._createChildren(added))
+        self._notifier.loading_done.emit(self)
+
+    def _createChildren(self, entries):
+        self._async_loader.name_index.add(entries)
+        return [
+            DropboxPathItem(
+                self._async_loader,
+                self._unchecked,
+                path_display=e.path_display,
+                path_lower=e.path_lower,
+                is_folder=e.is_folder,
+                size=e.size,
+                parent=self,
+            )
+            for e in entries
+        ]
+
+    def _removeMessages(self):
+        # messages are always placed after all other children
+        if self._children and isinstance(self._children[-1], MessageTreeItem):
+            self._setChildren(
+                [c for c in self._children if not isinstance(c, MessageTreeItem)]
+            )
+
+    def _insertChildren(self, new_nodes):
+        # Merge new items into our children which are already sorted. Both are sorted
+        # runs, which are merged in linear time by list.sort.
+        column, order = self._sortedBy
+        reverse = order == Qt.SortOrder.DescendingOrder
+        key = _sort_key(column, reverse)
+
+        for node in new_nodes:
+            self._countChildState(node._checkState, 1)
+
+        new_nodes.sort(key=key, reverse=reverse)
+        self._children.extend(new_nodes)
+        self._children.sort(key=key, reverse=reverse)
+        self._rowsDirty = True
 
     def data(self, column):
+        if column == 2:
+            size = self.size
+            return "" if size is None else natural_size(size)
         return (self._basename, "")[column]
 
     def header(self):
-        return ["Name", "Included"]
+        return ["Name", "Included", "Size"]
+
+    def headerToolTip(self, column):
+        if column == 2:
+            return _SIZE_TOOL_TIP
+        return None
+
+    def toolTip(self, column):
+        if column == 2 and self.size is None:
+            return _SIZE_TOOL_TIP
+        return None
 
     def _checkStatePropagateToChildren(self, state):
-        # propagate to children if checked or unchecked
-        if state in (0, 2) and self.child_count_loaded() > 0:
-            for child in self._children:
-                child._checkStateChanged = True
-                child._checkState = state
-                child._checkStatePropagateToChildren(state)
+        # propagate to all loaded descendants if checked or unchecked
+        if state not in (0, 2):
+            return
+
+        stack = [self]
+
+        while stack:
+            item = stack.pop()
+            if not item._children_update_started:
+                continue
+
+            n_children = 0
+
+            for child in item._children:
+                if isinstance(child, DropboxPathItem):
+                    child._checkStateChanged = True
+                    child._countModified(child._checkState, state)
+                    child._checkState = state
+                    stack.append(child)
+                    n_children += 1
+
+            # all children now share the same state, set the counters directly
+            item._nChecked = n_children if state == 2 else 0
+            item._nPartial = 0
+            item._nUnchecked = n_children if state == 0 else 0
 
     def _checkStatePropagateToParent(self, state):
         # propagate to parent if checked or unchecked
         if self._parent:
-            self._parent._checkStateChanged = True
-            # get minimum of all other children's check state
-            checkstate_other_children = min(
-                c.checkState for c in self._parent._children
-            )
-            # set parent's state to that minimum, if it >= 1 (there always could be
-            # included files)
-            new_parent_state = max([checkstate_other_children, 1])
-            self._parent._checkState = new_parent_state
-            # tell the parent to propagate its own state upwards
-            self._parent._checkStatePropagateToParent(state)
+            self._parent._checkStateUpdateFromChildren()
+
+    def _checkStateUpdateFromChildren(self):
+        # Walk up the tree and derive each item's state from its child counters. An
+        # item is checked if all of its children are checked, otherwise it is
+        # partially checked since there always could be included files. We can stop
+        # once an item's state does not change.
+        item = self
+
+        while item:
+            item._checkStateChanged = True
+
+            if item._nPartial == 0 and item._nUnchecked == 0:
+                new_state = 2
+            else:
+                new_state = 1
+
+            if not item._assignCheckState(new_state):
+                break
+
+            item = item._parent
+
+    def setChildrenCheckState(self, state):
+        self._checkStateChanged = True
+        self._checkStatePropagateToChildren(state)
+        self._checkStateUpdateFromChildren()
 
     @property
     def checkStateChanged(self):
@@ -428,67 +1037,734 @@ class DropboxPathItem(AbstractTreeItem):
     def sort(self, column, order):
         reverse = order == Qt.SortOrder.DescendingOrder
 
-        self._children.sort(
-            key=lambda x: _sort_key(x, column, reverse), reverse=reverse
-        )
+        items = [c for c in self._children if not isinstance(c, MessageTreeItem)]
+        messages = [c for c in self._children if isinstance(c, MessageTreeItem)]
+        items.sort(key=_sort_key(column, reverse), reverse=reverse)
 
-        for child in self._children:
-            child.sort(column, order)
+        self._children = items + messages
+        self._sortedBy = (column, order)
+        self._rowsDirty = True
+
+
+class PagedListing(QtCore.QObject):
+    """
+    A listing of a folder's children, see :meth:`AsyncListFolder.listChildren`. Pages
+    are listed as they are requested. A listing which waits for further pages to be
+    requested ends its background task to free the thread. It keeps its connection to
+    the daemon and the daemon's iterator over the folder and continues where it paused
+    in a new task.
+
+    :param str path: Dropbox path to list.
+    :param int pages: Number of pages to list before the listing pauses.
+    :param parent: QObject. Defaults to None.
+    """
+
+    sig_result = Signal(object)
+    sig_done = Signal()
+
+    def __init__(self, path, pages, parent=None):
+        super().__init__(parent=parent)
+        self.path = path
+        self.task = None  # task which currently lists the folder
+        self.requested = pages
+        self.received = 0
+        self.cancelled = False
+
+        # shared with the worker thread
+        self.credits = threading.Semaphore(pages)
+        self.release = threading.Event()  # asks a waiting task to end
+        self.paused = False  # whether the last task ended to wait for more pages
+
+        # kept by a paused listing to continue where it paused
+        self.proxy = None
+        self.iterator = None
+        self.entries = []  # all entries listed so far
+        self.pending = None  # page which was listed but not emitted yet
+
+    def isWaiting(self):
+        """Whether all requested pages have been received."""
+        return self.received >= self.requested
+
+    def closeConnection(self):
+        """Closes the connection to the daemon which was kept while paused."""
+        if self.proxy:
+            _claimProxy(self.proxy)
+            self.proxy._disconnect()
+
+        self.proxy = None
+        self.iterator = None
 
 
 class AsyncListFolder(QtCore.QObject):
-    def __init__(self, config_name, parent=None):
-        """
-        A helper which creates instances of :class:`BackgroundTask` to
-        asynchronously list Dropbox folders
+    """
+    A helper which creates instances of :class:`BackgroundTask` to asynchronously list
+    Dropbox folders. Listings are queued by priority, most recent first, and at most
+    :attr:`max_running` listings run at the same time, leaving background threads to
+    other tasks. Each listing can be cancelled individually.
+
+    :param str config_name: Config name of Maestral instance
+    :param parent: QObject. Defaults to None.
+    :param int max_running: Maximum number of concurrent listings.
+    """
 
-        :param str config_name: Config name of Maestral instance
-        :param parent: QObject. Defaults to None.
-        """
+    # priorities of listings, lower values are started first
+    PRIORITY_EXPAND = 0
+    PRIORITY_REVALIDATE = 1
+    PRIORITY_PREFETCH = 2
+
+    # number of pages listed ahead of those requested by a view
+    PAGES_AHEAD = 2
+
+    # seconds for which a paused listing keeps its thread, waiting for more pages
+    PAUSE_TIMEOUT = 5
+
+    # larger folders are only listed once they are expanded
+    PREFETCH_MAX_ENTRIES = 10000
+
+    def __init__(self, config_name, parent=None, max_running=4):
         super().__init__(parent=parent)
         self.config_name = config_name
+        self.max_running = max_running
         self._abort_event = threading.Event()
+        self._cache = ListingCache(config_name)
+        self._namespace_checked = False
+        self._fresh = set()
+
+        # names of all listed items, to search the tree
+        self.name_index = NameIndex()
+
+        # Folder sizes from completed recursive listings, from running recursive
+        # listings and from the cache.
+        self._sizes = {}
+        self._partialSizes = {}
+        self._cachedSizes = {}
+
+        self._queue = []
+        self._counter = itertools.count()
+        self._running = set()
+        self._listings = set()
+        self._paused = set()  # listings without a task, waiting for more pages
+        self._task_abort_events = {}
+
+        # paused listings would otherwise block the thread pool on exit
+        QtCore.QCoreApplication.instance().aboutToQuit.connect(self.abortListing)
 
     def abortListing(self):
+        """Aborts all running and queued listings."""
         self._abort_event.set()
 
+        for task in self._running:
+            task.cancel()
+
+        while self._queue:
+            *_, task = heapq.heappop(self._queue)
+            self._finishQueued(task)
+
+        for listing in list(self._paused):
+            self._finishListing(listing)
+
+    def close(self):
+        """
+        Aborts all listings, closes the listing cache and deletes this instance once
+        control returns to the event loop. It must not be used afterwards.
+        """
+        self.abortListing()
+        QtCore.QCoreApplication.instance().aboutToQuit.disconnect(self.abortListing)
+        self._cache.close()
+        self.deleteLater()
+
+    def cancelListing(self, task):
+        """
+        Cancels a single listing. Its task will not emit any further results but still
+        emits `sig_done`.
+
+        :param task: Task or paged listing returned by one of the listing methods.
+        """
+        if isinstance(task, PagedListing):
+            listing = task
+
+            if listing not in self._listings or listing.cancelled:
+                return
+
+            listing.cancelled = True
+
+            if listing.task:
+                # finished once its task is done
+                self.cancelListing(listing.task)
+            else:
+                self._finishListing(listing)
+
+            return
+
+        abort_event = self._task_abort_events.get(task)
+
+        if abort_event is None:
+            # listing has already finished
+            return
+
+        abort_event.set()
+        task.cancel()
+
+        if task not in self._running:
+            for i, entry in enumerate(self._queue):
+                if entry[-1] is task:
+                    self._queue.pop(i)
+                    heapq.heapify(self._queue)
+                    break
+
+            self._finishQueued(task)
+
     def listChildren(self, path):
         """
-        Returns a running instance of :class:`maestral.gui.utils.BackgroundTask` which
-        will emit `sig_result` once it has a result.
+        Returns an instance of :class:`PagedListing` which will emit `sig_result` for
+        every page of entries once it has a result and `sig_done` once the listing
+        has completed, failed or was cancelled. The listing is started before any
+        revalidation or prefetch. Only :attr:`PAGES_AHEAD` pages are listed before the
+        listing pauses, further pages must be requested with :meth:`fetchMore`.
+
+        A paused listing frees its thread after :attr:`PAUSE_TIMEOUT` seconds, or
+        once another folder is to be listed while :attr:`max_running` listings run.
+
         :param str path: Dropbox path to list.
-        :returns: Running background task.
+        :returns: Queued or running listing.
+        :rtype: :class:`PagedListing`
+        """
+        listing = PagedListing(path, self.PAGES_AHEAD, parent=self)
+        self._listings.add(listing)
+        self._scheduleListing(listing)
+
+        return listing
+
+    def isPaused(self, listing):
+        """
+        Whether a listing started with :meth:`listChildren` is waiting for further
+        pages to be requested.
+
+        :param listing: Listing returned by :meth:`listChildren`.
+        :rtype: bool
+        """
+        return listing in self._listings and listing.isWaiting()
+
+    def fetchMore(self, listing, pages=1):
+        """
+        Requests further pages of a listing started with :meth:`listChildren`.
+
+        :param listing: Listing returned by :meth:`listChildren`.
+        :param int pages: Number of pages to list.
+        """
+        if listing not in self._listings or listing.cancelled:
+            return
+
+        listing.requested += pages
+        listing.credits.release(pages)
+
+        if listing in self._paused:
+            self._paused.discard(listing)
+            self._scheduleListing(listing)
+
+    def cachedChildren(self, path):
+        """
+        Returns the entries of a Dropbox folder from the last complete listing.
+
+        :param str path: Normalized Dropbox path.
+        :returns: Cached folder entries or None if the folder has not been listed
+            before.
+        :rtype: list[:class:`maestral_qt.listing_cache.FolderEntry`] | None
+        """
+        return self._cache.get(path)
+
+    def isFresh(self, path):
+        """
+        Whether a folder has been completely listed by this instance, such that its
+        cached entries are up-to-date.
+
+        :param str path: Normalized Dropbox path.
+        :rtype: bool
+        """
+        return path in self._fresh
+
+    def clearCache(self):
+        """Clears all cached folder listings and sizes."""
+        self._cache.clear()
+        self._fresh.clear()
+        self._sizes.clear()
+        self._cachedSizes.clear()
+
+    def folderSize(self, path):
+        """
+        Returns the total size of all files in a folder and its descendants. Sizes are
+        aggregated by recursive listings. While a recursive listing runs, the sizes
+        of folders which are not cached grow as pages arrive.
+
+        :param str path: Normalized Dropbox path.
+        :returns: Size in bytes or None if not known.
+        :rtype: int | None
+        """
+        size = self._sizes.get(path)
+
+        if size is None:
+            try:
+                size = self._cachedSizes[path]
+            except KeyError:
+                size = self._cache.get_size(path)
+                self._cachedSizes[path] = size
+
+        if size is None:
+            size = self._partialSizes.get(path)
+
+        return size
+
+    def prefetchChildren(self, path):
+        """
+        Returns an instance of :class:`maestral.gui.utils.BackgroundTask` which lists
+        a folder into the cache. Its children can then be shown immediately with
+        :meth:`cachedChildren`. Prefetches are started last.
+
+        :param str path: Dropbox path to list.
+        :returns: Queued or running background task.
         :rtype: :class:`maestral.gui.utils.BackgroundTask`
         """
+        return self._schedule(
+            self._listAllChildren,
+            path,
+            self.PRIORITY_PREFETCH,
+            max_entries=self.PREFETCH_MAX_ENTRIES,
+        )
+
+    def listRecursive(self, path):
+        """
+        Returns an instance of :class:`maestral.gui.utils.BackgroundTask` which lists
+        a folder and all its descendants and emits `sig_result` for every page of
+        entries, or with False if the listing failed. Once complete, the listings of
+        all folders are saved to the cache. Recursive listings are started last.
+
+        :param str path: Dropbox path to list.
+        :returns: Queued or running background task.
+        :rtype: :class:`maestral.gui.utils.BackgroundTask`
+        """
+        return self._schedule(
+            self._listRecursive,
+            path,
+            self.PRIORITY_PREFETCH,
+            priority_class=TaskExecutor.STREAM,
+        )
+
+    def revalidateChildren(self, path):
+        """
+        Returns an instance of :class:`maestral.gui.utils.BackgroundTask` which lists
+        a folder again and emits `sig_result` once with all entries, or with False if
+        the listing failed.
+
+        :param str path: Dropbox path to list.
+        :returns: Queued or running background task.
+        :rtype: :class:`maestral.gui.utils.BackgroundTask`
+        """
+        return self._schedule(self._listAllChildren, path, self.PRIORITY_REVALIDATE)
+
+    def _schedule(
+        self,
+        target,
+        path,
+        priority,
+        priority_class=TaskExecutor.BACKGROUND,
+        **kwargs,
+    ):
+        abort_event = threading.Event()
+        task = BackgroundTask(
+            parent=self,
+            target=target,
+            args=(path, abort_event),
+            kwargs=kwargs,
+            autostart=False,
+            priority_class=priority_class,
+        )
+        task.sig_done.connect(partial(self._onTaskDone, task))
+
+        self._task_abort_events[task] = abort_event
+        heapq.heappush(self._queue, (priority, -next(self._counter), task))
+
+        # start from the event loop, after the caller connected to the task's signals
+        QtCore.QTimer.singleShot(0, self._startQueued)
+
+        return task
+
+    def _startQueued(self):
+        while self._queue and len(self._running) < self.max_running:
+            *_, task = heapq.heappop(self._queue)
+            self._running.add(task)
+            task.start()
+
+        if self._queue and self._queue[0][0] == self.PRIORITY_EXPAND:
+            # a folder was expanded, listings which wait for more pages free their
+            # threads instead of waiting for PAUSE_TIMEOUT
+            for listing in self._listings:
+                if listing.task in self._running and listing.isWaiting():
+                    listing.release.set()
+
+    def _finishQueued(self, task):
+        # notify listeners of a task which was removed from the queue before it started
+        self._task_abort_events.pop(task, None)
+        task.sig_done.emit()
+
+    def _scheduleListing(self, listing):
+        listing.paused = False
+        listing.release.clear()
+        listing.task = self._schedule(
+            self._listChildren, listing.path, self.PRIORITY_EXPAND, paging=listing
+        )
+        listing.task.sig_result.connect(partial(self._onListingPage, listing))
+        listing.task.sig_done.connect(partial(self._onListingTaskDone, listing))
+
+    def _onListingPage(self, listing, page):
+        listing.received += 1
+        listing.sig_result.emit(page)
+
+    def _onListingTaskDone(self, listing):
+        listing.task = None
+
+        if listing.cancelled or self._abort_event.is_set() or not listing.paused:
+            self._finishListing(listing)
+        elif not listing.isWaiting():
+            # more pages were requested while the task ended
+            self._scheduleListing(listing)
+        else:
+            self._paused.add(listing)
+
+    def _finishListing(self, listing):
+        self._listings.discard(listing)
+        self._paused.discard(listing)
+        listing.closeConnection()
+        listing.sig_done.emit()
+        listing.deleteLater()
+
+    def _onTaskDone(self, task):
+        self._task_abort_events.pop(task, None)
+        self._running.discard(task)
+        task.deleteLater()
 
-        new_job = BackgroundTask(parent=self, target=self._listChildren, args=(path,))
+        self._startQueued()
 
-        return new_job
+    def _listAllChildren(self, path, abort_event=None, max_entries=None):
+        entries = []
 
-    def _listChildren(self, path):
+        for page in self._listChildren(path, abort_event):
+            if page is False:
+                return False
+            entries.extend(page)
+
+            if max_entries and len(entries) > max_entries:
+                return False
+
+        if self._abort_event.is_set() or (abort_event and abort_event.is_set()):
+            return False
+
+        return entries
+
+    def _listChildren(self, path, abort_event=None, paging=None):
         """The actual function which does the listing. Returns an iterator over the
-        entries in the Dropbox folder."""
+        entries in the Dropbox folder. Complete listings are saved to the cache. If a
+        :class:`PagedListing` is given, a page credit is acquired before each page is
+        emitted. When no page is requested in time, the listing keeps the connection
+        and the iterator to continue where it paused."""
+
+        if paging and paging.iterator:
+            m = paging.proxy
+            entries_iterator = paging.iterator
+            listing = paging.entries
+            paging.proxy = None
+            paging.iterator = None
+            _claimProxy(m)
+        else:
+            # use a duplicate proxy to prevent blocking of the main connection
+            m = MaestralProxy(self.config_name)
+            entries_iterator = None
+            listing = []
 
-        # use a duplicate proxy to prevent blocking of the main connection
-        with MaestralProxy(self.config_name) as m:
-            entries_iterator = m.list_folder_iterator(path)
+        try:
+            if not entries_iterator:
+                self._checkNamespace(m)
+                entries_iterator = m.list_folder_iterator(path)
 
             while not self._abort_event.is_set():
-                try:
-                    entries = next(entries_iterator)
-                    entries.sort(key=lambda e: e.name.lower())
-                except (NotAFolderError, NotFoundError):
-                    entries = []
-                except ConnectionError:
-                    entries = False
-                except StopIteration:
+                if abort_event and abort_event.is_set():
+                    return
+
+                if paging and paging.pending is not None:
+                    # listed before the listing paused
+                    entries = paging.pending
+                    paging.pending = None
+                else:
+                    try:
+                        entries = [
+                            entry_from_metadata(md) for md in next(entries_iterator)
+                        ]
+                    except (NotAFolderError, NotFoundError):
+                        yield []
+                        return
+                    except ConnectionError:
+                        yield False
+                        return
+                    except StopIteration:
+                        if self._cache.set(path, listing):
+                            # the cache updated the sizes of the folder, its ancestors
+                            # and its subfolders, read them again from there
+                            changed = [e.path_lower for e in listing if e.is_folder]
+                            changed.extend(self_and_ancestors(path))
+                            for folder in changed:
+                                self._sizes.pop(folder, None)
+                                self._cachedSizes.pop(folder, None)
+                        self._fresh.add(path)
+                        return
+
+                    listing.extend(entries)
+
+                if paging and not self._waitForPage(paging, abort_event):
+                    if paging.paused:
+                        paging.proxy = m
+                        paging.iterator = entries_iterator
+                        paging.entries = listing
+                        paging.pending = entries
+                        m = None
                     return
 
                 yield entries
+        finally:
+            if m is not None:
+                m._disconnect()
+
+    def _waitForPage(self, paging, abort_event):
+        # Acquires a page credit. Returns False if the listing was aborted or no page
+        # was requested in time, the task then ends and is continued when requested.
+        deadline = time.monotonic() + self.PAUSE_TIMEOUT
+
+        while not paging.credits.acquire(timeout=0.2):
+            if self._abort_event.is_set() or (abort_event and abort_event.is_set()):
+                return False
+
+            if paging.release.is_set() or time.monotonic() > deadline:
+                paging.paused = True
+                return False
+
+        return True
+
+    def _listRecursive(self, path, abort_event=None):
+        """Lists a folder and all its descendants. Returns an iterator over pages of
+        entries in any order. The size of each file is added to all its ancestors as
+        pages arrive. Entries are staged in the cache and, once complete, the listings
+        and sizes of all folders are saved to the cache."""
+
+        sizes = {path: 0}
+        self._partialSizes = sizes
+        key = next(self._counter)
+        complete = False
+
+        try:
+            with MaestralProxy(self.config_name) as m:
+                self._checkNamespace(m)
+                entries_iterator = m.list_folder_iterator(path, recursive=True)
+
+                while not self._abort_event.is_set():
+                    if abort_event and abort_event.is_set():
+                        return
+
+                    try:
+                        page = next(entries_iterator)
+                    except (NotAFolderError, NotFoundError):
+                        return
+                    except ConnectionError:
+                        yield False
+                        return
+                    except StopIteration:
+                        self._cache.commit_staged(key, sizes)
+                        self._cache.set_sizes(sizes)
+                        self._fresh.update(sizes)
+                        self._sizes.update(sizes)
+                        complete = True
+                        return
+
+                    # the listing of a folder other than the root includes the folder
+                    entries = [entry_from_metadata(md) for md in page]
+                    entries = [e for e in entries if e.path_lower != path]
+
+                    for entry in entries:
+                        if entry.is_folder:
+                            sizes.setdefault(entry.path_lower, 0)
+                        elif entry.size:
+                            parent = os.path.dirname(entry.path_lower)
+                            for folder in self_and_ancestors(parent):
+                                sizes[folder] = sizes.get(folder, 0) + entry.size
+                                if folder == path:
+                                    break
+
+                    self._cache.stage(key, entries)
+
+                    yield entries
+        finally:
+            if not complete:
+                self._cache.discard_staged(key)
+
+    def _checkNamespace(self, m):
+        if not self._namespace_checked:
+            # discard listings from a previously linked account
+            self._cache.check_namespace(m.get_state("account", "path_root_nsid"))
+            self._namespace_checked = True
+
+
+def _claimProxy(m):
+    # Pyro proxies may only be used by the thread which owns them
+    claim = getattr(m._m, "_pyroClaimOwnership", None)
+    if claim:
+        claim()
+
+
+def normalize_excluded_items(excluded_items, old_excluded_items=()):
+    """
+    Reduces excluded items to the smallest sorted list which excludes the same items:
+    items inside an excluded folder are removed since they are excluded with it. The
+    result is compared to the current excluded items, which are reduced the same way.
+
+    :param excluded_items: Normalized Dropbox paths to exclude.
+    :param old_excluded_items: Normalized Dropbox paths which are currently excluded.
+    :returns: Minimal excluded items, newly excluded items and newly included items.
+    :rtype: tuple[list[str], list[str], list[str]]
+    """
+
+    def minimal(paths):
+        paths = set(paths)
+        return {
+            path
+            for path in paths
+            if not any(p in paths for p in self_and_ancestors(os.path.dirname(path)))
+        }
+
+    new = minimal(excluded_items)
+    old = minimal(old_excluded_items)
+
+    return sorted(new), sorted(new - old), sorted(old - new)
+
+
+class FolderPrefetcher(QtCore.QObject):
+    """
+    Lists folders which are visible in a tree view but not expanded yet. Their content
+    is then shown from the cache without a network round trip once they are expanded.
+    Folders which scroll out of view before their listing completes are skipped or
+    their listing is aborted. Further pages of a paged listing are requested once the
+    last loaded child of its folder is scrolled into view.
+
+    :param view: QTreeView which shows a :class:`FileSystemModel`.
+    :param async_loader: :class:`AsyncListFolder` used by the model's items.
+    :param int max_running: Maximum number of folders to prefetch at the same time.
+    :param parent: QObject. Defaults to None.
+    """
+
+    def __init__(self, view, async_loader, max_running=3, parent=None):
+        super().__init__(parent=parent)
+        self.max_running = max_running
+        self._view = view
+        self._model = view.model()
+        self._async_loader = async_loader
+        self._pending = []
+        self._running = {}
+
+        # coalesce scrolling and loading into a single update
+        self._update_timer = QtCore.QTimer(self)
+        self._update_timer.setSingleShot(True)
+        self._update_timer.setInterval(100)
+        self._update_timer.timeout.connect(self._update)
+
+        self._view.verticalScrollBar().valueChanged.connect(self.schedule)
+        self._view.expanded.connect(self.schedule)
+        self._view.collapsed.connect(self.schedule)
+        self._model.layoutChanged.connect(self.schedule)
+        self._model.modelReset.connect(self.schedule)
+
+    def schedule(self):
+        """Updates the folders to prefetch once the view has settled."""
+        self._update_timer.start()
+
+    def stop(self):
+        """Stops prefetching and aborts all running listings."""
+        self._update_timer.stop()
+        self._view.verticalScrollBar().valueChanged.disconnect(self.schedule)
+        self._view.expanded.disconnect(self.schedule)
+        self._view.collapsed.disconnect(self.schedule)
+        self._model.layoutChanged.disconnect(self.schedule)
+        self._model.modelReset.disconnect(self.schedule)
+
+        self._pending.clear()
+
+        for task in list(self._running.values()):
+            self._async_loader.cancelListing(task)
+
+    def _visibleIndexes(self):
+        viewport_height = self._view.viewport().height()
+        index = self._view.indexAt(QtCore.QPoint(0, 0))
+
+        while index.isValid() and self._view.visualRect(index).top() < viewport_height:
+            yield index
+            index = self._view.indexBelow(index)
+
+    def _visibleFolders(self, indexes):
+        # collapsed folders in the viewport whose children have not been requested
+        for index in indexes:
+            item = index.internalPointer()
+
+            if (
+                isinstance(item, DropboxPathItem)
+                and item.is_folder
+                and not item._children_update_started
+            ):
+                yield item._path_lower
+
+    def _fetchMoreShown(self, indexes):
+        # request further pages of folders whose last loaded child is in the viewport
+        for index in indexes:
+            parent = index.parent()
+            if index.row() == self._model.rowCount(parent) - 1:
+                self._model.fetchMoreChildren(parent)
+
+    def _update(self):
+        if self._view.model() is not self._model:
+            return
+
+        indexes = list(self._visibleIndexes())
+        self._fetchMoreShown(indexes)
+
+        visible = [
+            path
+            for path in self._visibleFolders(indexes)
+            if not self._async_loader.isFresh(path)
+        ]
+        visible_set = set(visible)
+
+        for path, task in list(self._running.items()):
+            if path not in visible_set:
+                self._async_loader.cancelListing(task)
+
+        self._pending = [path for path in visible if path not in self._running]
+        self._startPending()
+
+    def _startPending(self):
+        while self._pending and len(self._running) < self.max_running:
+            path = self._pending.pop(0)
+            task = self._async_loader.prefetchChildren(path)
+            task.sig_done.connect(partial(self._onListingDone, path))
+            self._running[path] = task
+
+    def _onListingDone(self, path):
+        self._running.pop(path, None)
+        self._startPending()
 
 
 # noinspection PyArgumentList
 class SelectiveSyncDialog(QtWidgets.QDialog, Ui_SelectiveSyncDialog):
+
+    # only the shallowest matches are shown for broad search queries
+    MAX_SEARCH_RESULTS = 1000
+
+    # maximum number of subfolders of the root to list in advance
+    PREWARM_MAX_FOLDERS = 20
+
     def __init__(self, mdbx, parent=None):
         super().__init__(parent=parent)
         self.setupUi(self)
@@ -496,16 +1772,92 @@ class SelectiveSyncDialog(QtWidgets.QDialog, Ui_SelectiveSyncDialog):
 
         self.mdbx = mdbx
         self.dbx_model = None
+        self.async_loader = None
+        self.prefetcher = None
+        self.prewarm_loader = None
         self.updateButton.setEnabled(False)
 
+        self.recursive_task = None
+        self._listed_recursively = False
+        self._search_query = None
+        self._search_matches = set()
+        self._search_ancestors = set()
+        self._search_expanded = set()
+
+        # search once the user stopped typing
+        self.search_timer = QtCore.QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(200)
+        self.search_timer.timeout.connect(self.update_search)
+
         self.ui_failed()
 
         # connect callbacks
         self.updateButton.clicked.connect(self.on_accepted)
         self.cancelButton.clicked.connect(self.close)
         self.selectAllCheckBox.clicked.connect(self.on_select_all_clicked)
+        self.treeViewFolders.collapsed.connect(self.on_folder_collapsed)
+        self.treeViewFolders.header().sortIndicatorChanged.connect(
+            self.on_sort_indicator_changed
+        )
+        self.searchLineEdit.textChanged.connect(self.on_search_text_changed)
+
+    def prewarm(self):
+        """
+        Lists the root folder and its first subfolders into the listing cache, in the
+        background and one folder at a time. The dialog then shows them immediately
+        when it is opened and revalidates them.
+        """
+        if self.dbx_model or self.prewarm_loader:
+            return
+
+        self.prewarm_loader = AsyncListFolder(
+            self.mdbx.config_name, self, max_running=1
+        )
+        task = self.prewarm_loader.prefetchChildren("/")
+        task.sig_done.connect(self._prewarm_subfolders)
+
+    def _prewarm_subfolders(self):
+        if not self.prewarm_loader:
+            # discarded when the dialog was populated
+            return
+
+        entries = self.prewarm_loader.cachedChildren("/") or []
+        folders = sorted(e.path_lower for e in entries if e.is_folder)
+
+        # most recent listings are started first
+        for path in reversed(folders[: self.PREWARM_MAX_FOLDERS]):
+            self.prewarm_loader.prefetchChildren(path)
+
+    def stop_listing(self):
+        """Stops prefetching and aborts all listings of the dialog."""
+        if self.prefetcher:
+            self.prefetcher.stop()
+            self.prefetcher.deleteLater()
+            self.prefetcher = None
+
+        if self.async_loader:
+            self.async_loader.abortListing()
 
     def populate_folders_list(self, overload=None):
+        if self.prefetcher:
+            self.prefetcher.stop()
+            self.prefetcher.deleteLater()
+            self.prefetcher = None
+
+        if self.prewarm_loader:
+            # cached listings are revalidated instead
+            self.prewarm_loader.close()
+            self.prewarm_loader = None
+
+        if self.recursive_task:
+            self.recursive_task.sig_result.disconnect(self.on_recursive_page)
+            self.recursive_task.sig_done.disconnect(self.on_recursive_listing_done)
+            self.recursive_task = None
+
+        if self.async_loader:
+            self.async_loader.close()
+
         self.excluded_items = set(self.mdbx.excluded_items)
         self.async_loader = AsyncListFolder(self.mdbx.config_name, self)
         self.dbx_root = DropboxPathItem(
@@ -514,36 +1866,194 @@ class SelectiveSyncDialog(QtWidgets.QDialog, Ui_SelectiveSyncDialog):
         )
         self.dbx_model = FileSystemModel(self.dbx_root)
         self.dbx_model.loading_done.connect(self.ui_loaded)
+        self.dbx_model.loading_done.connect(self.on_search_results_changed)
         self.dbx_model.loading_failed.connect(self.ui_failed)
         self.dbx_model.dataChanged.connect(self.update_select_all_checkbox)
         self.dbx_model.dataChanged.connect(self.update_dialog_buttons)
         self.treeViewFolders.setModel(self.dbx_model)
+        self.prefetcher = FolderPrefetcher(
+            self.treeViewFolders, self.async_loader, parent=self
+        )
 
-    def update_select_all_checkbox(self):
-        check_states = []
-        for irow in range(self.dbx_model._root_item.child_count_loaded()):
-            index = self.dbx_model.index(irow, 1, QModelIndex())
-            check_states.append(
-                self.dbx_model.data(index, Qt.ItemDataRole.CheckStateRole)
-            )
+        self._listed_recursively = False
+        self._search_query = None
+        self.searchLineEdit.clear()
 
-        if all(cs == 2 for cs in check_states):
-            self.selectAllCheckBox.setChecked(True)
-        else:
-            self.selectAllCheckBox.setChecked(False)
+        if self.treeViewFolders.header().sortIndicatorSection() == 2:
+            self.compute_folder_sizes()
+
+    def update_select_all_checkbox(self):
+        all_checked = self.dbx_model._root_item.allChildrenChecked()
+        self.selectAllCheckBox.setChecked(all_checked)
 
     def update_dialog_buttons(self):
-        self.updateButton.setEnabled(self.dbx_root.isSelectionModified())
+        self.updateButton.setEnabled(self.dbx_model.isSelectionModified())
 
     def on_select_all_clicked(self, checked):
         checked_state = 2 if checked else 0
-        for irow in range(self.dbx_model._root_item.child_count_loaded()):
-            index = self.dbx_model.index(irow, 1, QModelIndex())
-            self.dbx_model.setCheckState(index, checked_state)
+        self.dbx_model.setChildrenCheckState(QModelIndex(), checked_state)
+
+    def on_folder_collapsed(self, index):
+        # stop listing folders which are no longer shown
+        self.dbx_model.cancelLoading(index)
+
+    def on_sort_indicator_changed(self, section, order):
+        if section == 2 and self.dbx_model:
+            self.compute_folder_sizes()
+
+    def compute_folder_sizes(self):
+        """
+        Lists the entire Dropbox in the background to compute the size of all folders,
+        unless their sizes are cached. This is only done when sizes are needed to sort
+        folders since it may take a long time for a large Dropbox.
+        """
+        if self.async_loader.folderSize("/") is None:
+            self.list_recursively()
+
+    def list_recursively(self):
+        """
+        Lists the entire Dropbox in the background, to search it and to compute the
+        size of all folders. Folder sizes are shown as they grow with every page.
+        """
+        if self._listed_recursively:
+            return
+
+        self._listed_recursively = True
+        self.recursive_task = self.async_loader.listRecursive("/")
+        self.recursive_task.sig_result.connect(self.on_recursive_page)
+        self.recursive_task.sig_done.connect(self.on_recursive_listing_done)
+
+    def on_recursive_page(self, entries):
+        if entries is False:
+            # try again with the next search
+            self._listed_recursively = False
+            return
+
+        self.async_loader.name_index.add(entries)
+        self.dbx_model.refresh()
+        self.on_search_results_changed()
+
+    def on_recursive_listing_done(self):
+        self.recursive_task = None
+        self.dbx_model.refresh()
+
+        # apply the final sizes if sorted by size
+        header = self.treeViewFolders.header()
+        if header.sortIndicatorSection() == 2:
+            self.dbx_model.sort(2, header.sortIndicatorOrder())
+
+    # =============================================================================
+    # Search
+    # =============================================================================
+
+    def on_search_text_changed(self, text):
+        self.search_timer.start()
+
+    def on_search_results_changed(self):
+        # update results when folders have been listed, without delaying them
+        # indefinitely while listings keep arriving
+        if self.dbx_model.isFiltered() and not self.search_timer.isActive():
+            self.search_timer.start()
+
+    def update_search(self):
+        """
+        Filters the tree by the words in the search field. Matches are shown with
+        their ancestors and their content. Only folders which have been listed are
+        searched at first. All other folders are listed recursively in the background
+        if required, and results are updated as they arrive.
+        """
+        if not self.dbx_model:
+            return
+
+        query = self.searchLineEdit.text()
 
-    def closeEvent(self, event):
-        super().closeEvent(event)
-        self.async_loader.abortListing()
+        if not tokenize(query):
+            self._search_query = None
+            if self.dbx_model.isFiltered():
+                self.dbx_model.setRowFilter(None)
+            self.selectAllCheckBox.setEnabled(True)
+            return
+
+        self.list_recursively()
+
+        matches = heapq.nsmallest(
+            self.MAX_SEARCH_RESULTS,
+            self.async_loader.name_index.search(query),
+            key=lambda path: (path.count("/"), path),
+        )
+        matches = set(matches)
+
+        if query != self._search_query:
+            self._search_query = query
+            self._search_expanded.clear()
+
+        if matches != self._search_matches or not self.dbx_model.isFiltered():
+            ancestors = set()
+
+            for path in matches:
+                path = os.path.dirname(path)
+                while path not in ancestors and path != "/":
+                    ancestors.add(path)
+                    path = os.path.dirname(path)
+
+            self._search_matches = matches
+            self._search_ancestors = ancestors
+            self.dbx_model.setRowFilter(self._search_accepts)
+
+        self.selectAllCheckBox.setEnabled(False)
+        self._expand_search_ancestors()
+
+    def _search_accepts(self, item):
+        if not isinstance(item, DropboxPathItem):
+            return True
+
+        path = item._path_lower
+
+        if path in self._search_matches or path in self._search_ancestors:
+            return True
+
+        # show the content of matching folders
+        parent = item._parent
+
+        while parent:
+            if parent._path_lower in self._search_matches:
+                return True
+            parent = parent._parent
+
+        return False
+
+    def _expand_search_ancestors(self):
+        # Expand the ancestors of all matches, which lists them if required. Folders
+        # are only expanded once per query such that users can collapse them again.
+        stack = [QModelIndex()]
+
+        while stack:
+            parent = stack.pop()
+
+            for row in range(self.dbx_model.rowCount(parent)):
+                index = self.dbx_model.index(row, 0, parent)
+                item = index.internalPointer()
+
+                if (
+                    not isinstance(item, DropboxPathItem)
+                    or item._path_lower not in self._search_ancestors
+                ):
+                    continue
+
+                if item._path_lower not in self._search_expanded:
+                    self._search_expanded.add(item._path_lower)
+                    self.treeViewFolders.expand(index)
+                elif not self.treeViewFolders.isExpanded(index):
+                    continue
+
+                stack.append(index)
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+
+        # the dialog is closed, accepted or rejected, not just minimized
+        if not event.spontaneous():
+            self.stop_listing()
 
     def on_accepted(self, overload=None):
         """
@@ -553,7 +2063,15 @@ class SelectiveSyncDialog(QtWidgets.QDialog, Ui_SelectiveSyncDialog):
             self.dbx_model.on_loading_failed()
 
         else:
-            excluded_items = self.get_excluded_items()
+            excluded_items, added, removed = normalize_excluded_items(
+                self.get_excluded_items(), self.mdbx.excluded_items
+            )
+
+            if not added and not removed:
+                # nothing to apply
+                self.accept()
+                return
+
             try:
                 self.mdbx.excluded_items = excluded_items
             except BusyError as err:
@@ -593,9 +2111,31 @@ class SelectiveSyncDialog(QtWidgets.QDialog, Ui_SelectiveSyncDialog):
                     if is_equal_or_child(path, node._path_lower):
                         excluded_items.discard(path)
 
-            for child in node._children:
-                if isinstance(child, DropboxPathItem):
-                    queue.put(child)
+            # All descendants of checked or unchecked items share their state. Only
+            # partially checked items need to be traversed.
+            if node.checkState == 1:
+                for child in node._children:
+                    if isinstance(child, DropboxPathItem):
+                        queue.put(child)
+
+        # Remove items which no longer exist, as far as their folders have been listed
+        # completely in this session.
+        listed_children = {}
+
+        for path in excluded_items.copy():
+            folder = os.path.dirname(path)
+
+            if folder not in listed_children:
+                entries = None
+                if self.async_loader.isFresh(folder):
+                    entries = self.async_loader.cachedChildren(folder)
+                listed_children[folder] = (
+                    None if entries is None else {e.path_lower for e in entries}
+                )
+
+            children = listed_children[folder]
+            if children is not None and path not in children:
+                excluded_items.discard(path)
 
         return excluded_items
 
@@ -604,7 +2144,7 @@ class SelectiveSyncDialog(QtWidgets.QDialog, Ui_SelectiveSyncDialog):
         self.selectAllCheckBox.setEnabled(False)
 
     def ui_loaded(self):
-        self.selectAllCheckBox.setEnabled(True)
+        self.selectAllCheckBox.setEnabled(not self.dbx_model.isFiltered())
         self.treeViewFolders.resizeColumnToContents(0)
 
     def changeEvent(self, event):
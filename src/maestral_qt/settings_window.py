@@ -14,8 +14,6 @@ from maestral.utils.appdirs import get_home_dir
 
 # local imports
 from . import __version__, __author__, __url__
-from .selective_sync_dialog import SelectiveSyncDialog
-from .bandwidth_dialog import BandwidthDialog
 from .utils import (
     LINE_COLOR_DARK,
     LINE_COLOR_LIGHT,
@@ -28,7 +26,6 @@ from .utils import (
     is_empty,
 )
 from .widgets import UserDialog
-from .autostart import AutoStart
 from .resources import (
     native_item_icon,
     APP_ICON_PATH,
@@ -67,6 +64,7 @@ class UnlinkDialog(QtWidgets.QDialog, Ui_UnlinkDialog):
         self.unlink_thread.sig_result.connect(self._on_unlink_complete)
 
     def _on_unlink_complete(self):
+        self.mdbx.invalidate()
         super().accept()
         self.on_unlink_complete()
 
@@ -92,10 +90,12 @@ class SettingsWindow(QtWidgets.QWidget, Ui_SettingsWindow):
         self.adjustSize()
 
         self.mdbx = mdbx
-        self.selective_sync_dialog = SelectiveSyncDialog(self.mdbx, parent=self)
-        self.bandwidth_dialog = BandwidthDialog(self.mdbx, parent=self)
-        self.unlink_dialog = UnlinkDialog(self.mdbx, self.on_unlink, parent=self)
-        self.autostart = AutoStart(self.mdbx.config_name)
+        self.autostart = parent.autostart
+
+        # dialogs are created when first opened
+        self._selective_sync_dialog = None
+        self._bandwidth_dialog = None
+        self._unlink_dialog = None
 
         self.labelAccountName.setFont(get_scaled_font(1.5))
         self.labelAccountInfo.setFont(get_scaled_font(0.9))
@@ -112,12 +112,9 @@ class SettingsWindow(QtWidgets.QWidget, Ui_SettingsWindow):
         self.update_timer.timeout.connect(self.refresh_gui)
 
         # connect callbacks
-        self.pushButtonUnlink.clicked.connect(self.unlink_dialog.exec)
-        self.pushButtonExcludedFolders.clicked.connect(
-            self.selective_sync_dialog.populate_folders_list
-        )
-        self.pushButtonExcludedFolders.clicked.connect(self.selective_sync_dialog.open)
-        self.pushButtonBandwidthLimits.clicked.connect(self.bandwidth_dialog.open)
+        self.pushButtonUnlink.clicked.connect(self.on_unlink_clicked)
+        self.pushButtonExcludedFolders.clicked.connect(self.on_excluded_folders_clicked)
+        self.pushButtonBandwidthLimits.clicked.connect(self.on_bandwidth_limits_clicked)
         self.checkBoxStartup.stateChanged.connect(self.on_start_on_login_clicked)
         self.checkBoxNotifications.stateChanged.connect(self.on_notifications_clicked)
         self.comboBoxUpdateInterval.currentIndexChanged.connect(
@@ -142,6 +139,34 @@ class SettingsWindow(QtWidgets.QWidget, Ui_SettingsWindow):
 
         center_window(self)
 
+    @property
+    def selective_sync_dialog(self):
+        """The dialog to select which folders to sync."""
+        if self._selective_sync_dialog is None:
+            from .selective_sync_dialog import SelectiveSyncDialog
+
+            self._selective_sync_dialog = SelectiveSyncDialog(self.mdbx, parent=self)
+
+        return self._selective_sync_dialog
+
+    @property
+    def bandwidth_dialog(self):
+        """The dialog to set bandwidth limits."""
+        if self._bandwidth_dialog is None:
+            from .bandwidth_dialog import BandwidthDialog
+
+            self._bandwidth_dialog = BandwidthDialog(self.mdbx, parent=self)
+
+        return self._bandwidth_dialog
+
+    @property
+    def unlink_dialog(self):
+        """The dialog to unlink the Dropbox account."""
+        if self._unlink_dialog is None:
+            self._unlink_dialog = UnlinkDialog(self.mdbx, self.on_unlink, parent=self)
+
+        return self._unlink_dialog
+
     def refresh_gui(self):
         # populate account info
         self.set_profile_pic_from_cache()
@@ -260,6 +285,9 @@ class SettingsWindow(QtWidgets.QWidget, Ui_SettingsWindow):
         task.sig_result.connect(self.on_move_completed)
 
     def on_move_completed(self, result):
+        # the folder was moved over another connection, the cached path is outdated
+        self.mdbx.invalidate()
+
         if isinstance(result, Exception):
             title = "Could not move directory"
             msg = str(result.args[0])
@@ -278,6 +306,16 @@ class SettingsWindow(QtWidgets.QWidget, Ui_SettingsWindow):
     def on_notifications_clicked(self, state):
         self.mdbx.notification_level = 15 if state == 2 else 30
 
+    def on_unlink_clicked(self):
+        self.unlink_dialog.exec()
+
+    def on_excluded_folders_clicked(self):
+        self.selective_sync_dialog.populate_folders_list()
+        self.selective_sync_dialog.open()
+
+    def on_bandwidth_limits_clicked(self):
+        self.bandwidth_dialog.open()
+
     def on_unlink(self):
         self.update_timer.stop()
         self._parent.restart()
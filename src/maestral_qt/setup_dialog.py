@@ -15,7 +15,12 @@ from maestral.utils.path import delete
 # local imports
 from .utils import MaestralBackgroundTask, icon_to_pixmap, is_empty
 from .widgets import UserDialog
-from .selective_sync_dialog import AsyncListFolder, FileSystemModel, DropboxPathItem
+from .selective_sync_dialog import (
+    AsyncListFolder,
+    FileSystemModel,
+    DropboxPathItem,
+    FolderPrefetcher,
+)
 from .resources import APP_ICON_PATH, native_folder_icon
 from .resources.ui_setup_dialog import Ui_SetupDialog
 
@@ -33,6 +38,8 @@ class SetupDialog(QtWidgets.QDialog, Ui_SetupDialog):
         self.mdbx = mdbx
         self.config_name = self.mdbx.config_name
         self.dbx_model = None
+        self.async_loader = None
+        self.prefetcher = None
         self.excluded_items = []
 
         self.app_icon = QtGui.QIcon(APP_ICON_PATH)
@@ -109,6 +116,7 @@ class SetupDialog(QtWidgets.QDialog, Ui_SetupDialog):
         self.pushButtonFolderSelectionSelect.clicked.connect(self.on_folders_selected)
         self.pushButtonClose.clicked.connect(self.on_accept_requested)
         self.selectAllCheckBox.clicked.connect(self.on_select_all_clicked)
+        self.treeViewFolders.collapsed.connect(self.on_folder_collapsed)
 
         if not self.mdbx.pending_link:
             self.stackedWidget.setCurrentIndex(2)
@@ -162,6 +170,9 @@ class SetupDialog(QtWidgets.QDialog, Ui_SetupDialog):
         self.auth_task.sig_result.connect(self.on_link_done)
 
     def on_link_done(self, res):
+        # the account was linked over the task's own connection
+        self.mdbx.invalidate()
+
         if res == 0:
             # switch to next page
             self.stackedWidget.slideInIdx(2)
@@ -261,13 +272,25 @@ class SetupDialog(QtWidgets.QDialog, Ui_SetupDialog):
     def populate_folders_list(self):
         self.pushButtonFolderSelectionSelect.setEnabled(False)
 
+        if self.prefetcher:
+            self.prefetcher.stop()
+            self.prefetcher.deleteLater()
+
+        if self.async_loader:
+            self.async_loader.close()
+
         self.async_loader = AsyncListFolder(self.mdbx.config_name, self)
+        self.async_loader.clearCache()  # don't show listings of a previous account
         self.dbx_root = DropboxPathItem(
             self.async_loader, set(self.mdbx.excluded_items)
         )
         self.dbx_model = FileSystemModel(self.dbx_root)
         self.dbx_model.dataChanged.connect(self.update_select_all_checkbox)
         self.treeViewFolders.setModel(self.dbx_model)
+        self.treeViewFolders.setColumnHidden(2, True)  # folder sizes are not listed
+        self.prefetcher = FolderPrefetcher(
+            self.treeViewFolders, self.async_loader, parent=self
+        )
 
         self.dbx_model.loading_done.connect(
             lambda: self.pushButtonFolderSelectionSelect.setEnabled(True)
@@ -288,22 +311,16 @@ class SetupDialog(QtWidgets.QDialog, Ui_SetupDialog):
         )
 
     def update_select_all_checkbox(self):
-        check_states = []
-        for irow in range(self.dbx_model._root_item.child_count_loaded()):
-            index = self.dbx_model.index(irow, 1, QModelIndex())
-            check_states.append(
-                self.dbx_model.data(index, Qt.ItemDataRole.CheckStateRole)
-            )
-        if all(cs == 2 for cs in check_states):
-            self.selectAllCheckBox.setChecked(True)
-        else:
-            self.selectAllCheckBox.setChecked(False)
+        all_checked = self.dbx_model._root_item.allChildrenChecked()
+        self.selectAllCheckBox.setChecked(all_checked)
 
     def on_select_all_clicked(self, checked):
         checked_state = 2 if checked else 0
-        for irow in range(self.dbx_model._root_item.child_count_loaded()):
-            index = self.dbx_model.index(irow, 1, QModelIndex())
-            self.dbx_model.setCheckState(index, checked_state)
+        self.dbx_model.setChildrenCheckState(QModelIndex(), checked_state)
+
+    def on_folder_collapsed(self, index):
+        # stop listing folders which are no longer shown
+        self.dbx_model.cancelLoading(index)
 
     def get_excluded_items(self):
         # We start with an empty excluded list since this is the initial setup.
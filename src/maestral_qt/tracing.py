@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+# system imports
+import os
+import time
+import json
+import atexit
+from bisect import bisect_left
+from collections import deque, namedtuple
+
+
+TaskRecord = namedtuple(
+    "TaskRecord",
+    (
+        "name",
+        "priority_class",
+        "thread",
+        "enqueued",
+        "started",
+        "finished",
+        "size",
+        "outcome",
+        "result_times",
+    ),
+)
+"""A trace of a completed background task. Times are monotonic, in seconds."""
+
+OUTCOME_OK = "ok"
+OUTCOME_ERROR = "error"
+OUTCOME_CANCELLED = "cancelled"
+
+# upper bounds of histogram buckets, in milliseconds
+HISTOGRAM_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+def target_name(target):
+    """
+    Returns a readable name for the target of a worker.
+
+    :param target: Callable or name of a Maestral method.
+    :rtype: str
+    """
+    if isinstance(target, str):
+        return target
+
+    return getattr(target, "__qualname__", repr(target))
+
+
+def _histogram(durations):
+    counts = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+
+    for duration in durations:
+        counts[bisect_left(HISTOGRAM_BUCKETS, duration * 1000)] += 1
+
+    labels = [str(b) for b in HISTOGRAM_BUCKETS] + ["inf"]
+    return dict(zip(labels, counts))
+
+
+class TaskTracer:
+    """
+    Records completed background tasks in a ring buffer: the target, when the task was
+    queued, started and finished, how many results it emitted and whether it succeeded,
+    failed or was cancelled. Records can be summarized as latency histograms per
+    target and exported as JSON or in the Chrome trace event format, which can be
+    opened in chrome://tracing or Perfetto.
+
+    Startup milestones, such as when the tray icon is first shown, can be recorded
+    with :meth:`mark` and are exported together with the tasks.
+
+    Tracing is disabled by default, workers then skip all bookkeeping.
+
+    :param int capacity: Number of tasks to keep.
+    """
+
+    def __init__(self, capacity=2000):
+        self.enabled = False
+        self._records = deque(maxlen=capacity)
+        self._milestones = []
+
+    def record(self, record):
+        """
+        Adds a completed task to the ring buffer. Safe to call from any thread.
+
+        :param TaskRecord record: Trace of the task.
+        """
+        self._records.append(record)
+
+    def mark(self, name):
+        """
+        Records that a milestone was reached. Does nothing if tracing is disabled.
+
+        :param str name: Name of the milestone.
+        """
+        if self.enabled:
+            self._milestones.append((name, time.monotonic()))
+
+    def milestones(self):
+        """
+        Returns the time at which each milestone was reached, in seconds after the
+        first milestone, in the order in which they were reached.
+
+        :rtype: dict[str, float]
+        """
+        if not self._milestones:
+            return {}
+
+        start = self._milestones[0][1]
+        return {name: t - start for name, t in self._milestones}
+
+    def records(self):
+        """
+        Returns all recorded tasks, oldest first.
+
+        :rtype: list[TaskRecord]
+        """
+        return list(self._records)
+
+    def clear(self):
+        """Removes all recorded tasks and milestones."""
+        self._records.clear()
+        self._milestones.clear()
+
+    def histograms(self):
+        """
+        Returns histograms of the time which tasks waited in the queue, their run time
+        and the interval between their results, by target. Each histogram maps the
+        upper bound of a bucket in milliseconds to the number of tasks or results.
+
+        :rtype: dict[str, dict]
+        """
+        by_name = {}
+
+        for r in self.records():
+            by_name.setdefault(r.name, []).append(r)
+
+        histograms = {}
+
+        for name, records in by_name.items():
+            intervals = []
+
+            for r in records:
+                last = r.started
+                for t, _ in r.result_times:
+                    intervals.append(t - last)
+                    last = t
+
+            histograms[name] = {
+                "count": len(records),
+                "outcomes": {
+                    outcome: sum(r.outcome == outcome for r in records)
+                    for outcome in (OUTCOME_OK, OUTCOME_ERROR, OUTCOME_CANCELLED)
+                },
+                "queue_wait_ms": _histogram(r.started - r.enqueued for r in records),
+                "run_time_ms": _histogram(r.finished - r.started for r in records),
+                "result_interval_ms": _histogram(intervals),
+            }
+
+        return histograms
+
+    def export_json(self, path):
+        """
+        Writes all recorded tasks, the histograms by target and the milestones to a
+        JSON file.
+
+        :param str path: Path of the file.
+        """
+        data = {
+            "tasks": [r._asdict() for r in self.records()],
+            "histograms": self.histograms(),
+            "milestones": self.milestones(),
+        }
+
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+
+    def export_chrome_trace(self, path):
+        """
+        Writes all recorded tasks to a file in the Chrome trace event format. Each task
+        is shown on the thread which ran it and its results as instant events. The time
+        which tasks waited in the queue is shown as async events and milestones as
+        global instant events.
+
+        :param str path: Path of the file.
+        """
+        pid = os.getpid()
+        events = []
+
+        for i, r in enumerate(self.records()):
+            common = {"cat": r.priority_class, "pid": pid, "tid": r.thread}
+            name = f"{r.name} (queued)"
+            events.append(dict(common, name=name, ph="b", id=i, ts=r.enqueued * 1e6))
+            events.append(dict(common, name=name, ph="e", id=i, ts=r.started * 1e6))
+            events.append(
+                dict(
+                    common,
+                    name=r.name,
+                    ph="X",
+                    ts=r.started * 1e6,
+                    dur=(r.finished - r.started) * 1e6,
+                    args={"outcome": r.outcome, "size": r.size},
+                )
+            )
+            events.extend(
+                dict(common, name="result", ph="i", s="t", ts=t * 1e6, args={"size": n})
+                for t, n in r.result_times
+            )
+
+        events.extend(
+            dict(name=name, ph="i", s="g", pid=pid, tid=0, ts=t * 1e6)
+            for name, t in self._milestones
+        )
+
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+tracer = TaskTracer()
+
+# Set MAESTRAL_QT_TRACE to a file path to trace all tasks and startup milestones. A
+# Chrome trace is written to the path on exit, tasks, histograms and milestones to a
+# JSON file next to it.
+_trace_path = os.environ.get("MAESTRAL_QT_TRACE")
+
+if _trace_path:
+    tracer.enabled = True
+    atexit.register(tracer.export_chrome_trace, _trace_path)
+    atexit.register(
+        tracer.export_json, os.path.splitext(_trace_path)[0] + "-tasks.json"
+    )
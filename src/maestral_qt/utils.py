@@ -5,10 +5,15 @@ import sys
 import os
 import re
 import platform
+import threading
+import time
+import types
 import traceback
+from collections import deque
+from functools import partial
 
 # external packages
-from PyQt6 import QtCore, QtGui, QtWidgets
+from PyQt6 import QtCore, QtGui, QtWidgets, sip
 from PyQt6.QtCore import Qt, QRect
 from PyQt6.QtGui import QBrush, QImage, QPainter, QPixmap
 from PyQt6.QtCore import pyqtSignal as Signal
@@ -19,6 +24,14 @@ from maestral.daemon import MaestralProxy
 
 # local imports
 from .resources import rgb_to_luminance
+from .tracing import (
+    tracer,
+    target_name,
+    TaskRecord,
+    OUTCOME_OK,
+    OUTCOME_ERROR,
+    OUTCOME_CANCELLED,
+)
 
 
 THEME_DARK = "dark"
@@ -34,10 +47,6 @@ IS_MACOS_BUNDLE = IS_BUNDLE and IS_MACOS
 IS_LINUX_BUNDLE = IS_BUNDLE and IS_LINUX
 
 
-thread_pool = QtCore.QThreadPool()
-thread_pool.setMaxThreadCount(10)
-
-
 # ======================================================================================
 # Helper functions
 # ======================================================================================
@@ -255,70 +264,273 @@ def is_dark_window():
 # ======================================================================================
 
 
+class TaskExecutor:
+    """
+    Runs workers in separate thread pools for each priority class, such that tasks of
+    one class never wait for threads held by another. Interactive tasks are started in
+    response to user actions, background tasks are started by the app itself and
+    streams hold a thread for a long time, for instance to wait for status changes or
+    to list a folder recursively.
+
+    The time which tasks spend waiting for a free thread is recorded per class. If
+    tracing is enabled, each task is also recorded by :data:`tracing.tracer`.
+
+    :param dict[str, int] capacity: Number of threads reserved for each class.
+    """
+
+    INTERACTIVE = "interactive"
+    BACKGROUND = "background"
+    STREAM = "stream"
+
+    def __init__(self, capacity):
+        self._pools = {}
+        self._lock = threading.Lock()
+        self._queue_wait = {}  # priority class -> tasks started, total wait, max wait
+
+        for priority_class, max_threads in capacity.items():
+            pool = QtCore.QThreadPool()
+            pool.setMaxThreadCount(max_threads)
+            self._pools[priority_class] = pool
+            self._queue_wait[priority_class] = [0, 0.0, 0.0]
+
+    def start(self, worker, priority_class=INTERACTIVE):
+        """
+        Runs a worker once a thread of its priority class is free.
+
+        :param QtCore.QRunnable worker: Worker to run.
+        :param str priority_class: Priority class of the worker.
+        """
+        run = partial(self._run, worker, priority_class, time.monotonic())
+        self._pools[priority_class].start(run)
+
+    def queue_wait(self, priority_class):
+        """
+        Returns statistics of the time which tasks of a class waited for a thread.
+
+        :param str priority_class: Priority class.
+        :returns: Number of started tasks, mean and maximum wait in seconds.
+        :rtype: tuple[int, float, float]
+        """
+        with self._lock:
+            count, total, maximum = self._queue_wait[priority_class]
+
+        return count, total / count if count else 0.0, maximum
+
+    def _run(self, worker, priority_class, submitted):
+        started = time.monotonic()
+        wait = started - submitted
+
+        with self._lock:
+            stats = self._queue_wait[priority_class]
+            stats[0] += 1
+            stats[1] += wait
+            stats[2] = max(stats[2], wait)
+
+        if not tracer.enabled:
+            worker.run()
+            return
+
+        worker.result_times = []
+        worker.run()
+
+        if worker.token.is_cancelled():
+            outcome = OUTCOME_CANCELLED
+        elif worker.failed:
+            outcome = OUTCOME_ERROR
+        else:
+            outcome = OUTCOME_OK
+
+        tracer.record(
+            TaskRecord(
+                name=target_name(worker._target),
+                priority_class=priority_class,
+                thread=threading.get_ident(),
+                enqueued=submitted,
+                started=started,
+                finished=time.monotonic(),
+                size=sum(n for _, n in worker.result_times),
+                outcome=outcome,
+                result_times=worker.result_times,
+            )
+        )
+
+
+executor = TaskExecutor(
+    {
+        TaskExecutor.INTERACTIVE: 4,
+        TaskExecutor.BACKGROUND: 6,
+        TaskExecutor.STREAM: 3,
+    }
+)
+
+
+class CancellationToken:
+    """
+    A token to cooperatively cancel a task from another thread. The task checks the
+    token between steps, for instance between the items of a generator, and stops once
+    the token has been cancelled or its deadline has passed.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.deadline = None  # monotonic time after which the token expires
+
+    def cancel(self):
+        """Cancels the token."""
+        self._event.set()
+
+    def is_cancelled(self):
+        """
+        Whether the token has been cancelled or its deadline has passed.
+
+        :rtype: bool
+        """
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return True
+
+        return self._event.is_set()
+
+
+class ResultChannel:
+    """
+    A bounded first-in first-out channel which passes results from a worker thread to
+    its consumer. Adding a result blocks while the channel is full, such that a fast
+    producer waits for a slow consumer. The consumer is notified once when results
+    become available and then takes all pending results as a batch.
+
+    :param int max_pending: Maximum number of results in the channel.
+    """
+
+    def __init__(self, max_pending):
+        self.max_pending = max_pending
+        self._results = deque()
+        self._condition = threading.Condition()
+        self._notified = False
+
+    def put(self, result, token):
+        """
+        Adds a result to the channel, waiting while the channel is full.
+
+        :param result: Result to add.
+        :param CancellationToken token: Token which stops waiting when cancelled.
+        :returns: Whether the consumer must be notified of new results.
+        :rtype: bool
+        """
+        with self._condition:
+            while len(self._results) >= self.max_pending:
+                if token.is_cancelled():
+                    return False
+                self._condition.wait(0.2)
+
+            self._results.append(result)
+            notify = not self._notified
+            self._notified = True
+
+        return notify
+
+    def take_all(self):
+        """
+        Removes all pending results from the channel.
+
+        :returns: Results in the order in which they were added.
+        :rtype: list
+        """
+        with self._condition:
+            results = list(self._results)
+            self._results.clear()
+            self._notified = False
+            self._condition.notify_all()
+
+        return results
+
+
 class WorkerEmitter(QtCore.QObject):
-    sig_result = Signal(object)
+    sig_results_ready = Signal()
     sig_done = Signal()
 
 
 class Worker(QtCore.QRunnable):
-    """A worker object. To be used in QThreads."""
+    """A worker object. To be used in QThreads. The target is not called if the given
+    cancellation token is cancelled before the worker runs and results of generators
+    are no longer emitted once it is cancelled.
+
+    Results are passed on through a :class:`ResultChannel`, such that generators are
+    paused while :attr:`MAX_PENDING_RESULTS` results wait to be consumed."""
+
+    MAX_PENDING_RESULTS = 50
 
-    def __init__(self, target=None, args=None, kwargs=None):
+    def __init__(self, target=None, args=None, kwargs=None, token=None):
         super().__init__()
         self._target = target
         self._args = args or ()
         self._kwargs = kwargs or {}
+        self.token = token or CancellationToken()
+        self.results = ResultChannel(self.MAX_PENDING_RESULTS)
         self.emitter = WorkerEmitter()
+        self.failed = False
+
+        # time and size of each result, only recorded when tracing
+        self.result_times = None
 
     def run(self):
         try:
-            res = self._target(*self._args, **self._kwargs)
-
-            if hasattr(res, "__next__"):
-                while True:
-                    try:
-                        next_res = next(res)
-                        self.emitter.sig_result.emit(next_res)
-                    except StopIteration:
-                        return
-            else:
-                self.emitter.sig_result.emit(res)
+            if not self.token.is_cancelled():
+                res = self._target(*self._args, **self._kwargs)
+                self._emit_results(res)
         except Exception:
+            self.failed = True
             traceback.print_exc()
         finally:
             self.emitter.sig_done.emit()
 
+    def _emit_results(self, res):
+        if hasattr(res, "__next__"):
+            try:
+                for next_res in res:
+                    if self.token.is_cancelled():
+                        return
+                    self._put_result(next_res)
+            finally:
+                # release resources held by the generator if we stopped early
+                if hasattr(res, "close"):
+                    res.close()
+        elif not self.token.is_cancelled():
+            self._put_result(res)
+
+    def _put_result(self, res):
+        if self.result_times is not None:
+            size = len(res) if isinstance(res, list) else 1
+            self.result_times.append((time.monotonic(), size))
+
+        if self.results.put(res, self.token):
+            self.emitter.sig_results_ready.emit()
+
 
 class MaestralWorker(Worker):
     """A worker object for Maestral. It uses a separate Maestral proxy to prevent
     the main connection from blocking."""
 
-    def __init__(self, config_name="maestral", target=None, args=None, kwargs=None):
+    def __init__(
+        self, config_name="maestral", target=None, args=None, kwargs=None, token=None
+    ):
         self.config_name = config_name
         self.connection = None
-        super().__init__(target, args, kwargs)
+        super().__init__(target, args, kwargs, token)
 
     def run(self):
         try:
-            with MaestralProxy(self.config_name) as proxy:
-                self.connection = proxy._m._pyroConnection
-
-                func = proxy.__getattr__(self._target)
-                res = func(*self._args, **self._kwargs)
-
-                if hasattr(res, "__next__"):
-                    while True:
-                        try:
-                            next_res = next(res)
-                            self.emitter.sig_result.emit(next_res)
-                        except StopIteration:
-                            return
-                else:
-                    self.emitter.sig_result.emit(res)
+            if not self.token.is_cancelled():
+                with MaestralProxy(self.config_name) as proxy:
+                    self.connection = proxy._m._pyroConnection
+
+                    func = proxy.__getattr__(self._target)
+                    res = func(*self._args, **self._kwargs)
+                    self._emit_results(res)
 
         except ConnectionClosedError:
-            pass
+            self.failed = True
         except Exception as exc:
+            self.failed = True
             print("".join(exc._pyroTraceback))
             print("{}: {}".format(type(exc).__name__, exc))
         finally:
@@ -326,29 +538,228 @@ class MaestralWorker(Worker):
             self.emitter.sig_done.emit()
 
 
+class _Flight(QtCore.QObject):
+    """A worker whose results are shared by identical tasks which coalesce."""
+
+    def __init__(self, key, worker):
+        super().__init__()
+        self.key = key
+        self.worker = worker
+        self.tasks = []
+
+        worker.emitter.sig_results_ready.connect(self._on_results_ready)
+        worker.emitter.sig_done.connect(self._on_done)
+
+    def discard_task(self, task):
+        """Stops sharing results with a task which was restarted."""
+        self.tasks.remove(task)
+        self.on_task_cancelled()
+
+    def on_task_cancelled(self):
+        # stop the worker once no task waits for its results
+        if all(sip.isdeleted(t) or t.token.is_cancelled() for t in self.tasks):
+            self.worker.token.cancel()
+            self._unregister()
+
+    def _on_results_ready(self):
+        for res in self.worker.results.take_all():
+            for task in self.tasks:
+                if not sip.isdeleted(task):
+                    task._deliver(res)
+
+    def _on_done(self):
+        self._unregister()
+
+        for task in self.tasks:
+            if not sip.isdeleted(task):
+                task._on_done()
+
+    def _unregister(self):
+        if _flights.get(self.key) is self:
+            del _flights[self.key]
+
+
+_flights = {}  # key -> running flight
+
+
 class BackgroundTask(QtCore.QObject):
-    """A utility class to manage a worker thread."""
+    """A utility class to manage a worker thread. Tasks are interactive unless
+    another priority class of :class:`TaskExecutor` is given.
+
+    A task can be cancelled at any time and its worker is cancelled when the parent
+    of the task is deleted, for instance together with the window which created it.
+    It then emits `sig_cancelled` and no further results but still emits `sig_done`
+    once its worker has stopped. If a timeout in seconds is given, the task is
+    cancelled when it has not completed in time after it was started. A task which is
+    started again replaces its worker, a previous worker is cancelled and its results
+    are ignored.
+
+    Tasks which coalesce share a single execution and its results with all identical
+    tasks, with the same target, arguments and priority class, which are started
+    while it runs. Only targets without side effects should coalesce. The shared
+    execution is stopped when all tasks which share it are cancelled.
+
+    Tasks can be awaited in a coroutine run by :class:`CoroutineTask`, which returns
+    their last result."""
 
     sig_result = Signal(object)
     sig_done = Signal()
+    sig_cancelled = Signal()
 
     def __init__(
-        self, parent=None, target=None, args=None, kwargs=None, autostart=True
+        self,
+        parent=None,
+        target=None,
+        args=None,
+        kwargs=None,
+        autostart=True,
+        priority_class=TaskExecutor.INTERACTIVE,
+        timeout=None,
+        coalesce=False,
     ):
         super().__init__(parent)
         self._target = target
         self._args = args or ()
         self._kwargs = kwargs or {}
+        self.priority_class = priority_class
+        self.timeout = timeout
+        self.coalesce = coalesce
+        self.token = CancellationToken()
         self.worker = None
+        self._flight = None
+        self._result = None
+        self._cancelled = False
+        self._done = False
+        self._owner = None
+        self._owner_slots = []
+
+        self._timeout_timer = QtCore.QTimer(self)
+        self._timeout_timer.setSingleShot(True)
+        self._timeout_timer.timeout.connect(self.cancel)
 
         if autostart:
             self.start()
 
     def start(self):
-        self.worker = Worker(target=self._target, args=self._args, kwargs=self._kwargs)
-        self.worker.emitter.sig_result.connect(self.sig_result.emit)
-        self.worker.emitter.sig_done.connect(self.sig_done.emit)
-        thread_pool.start(self.worker)
+        self._detach_worker()
+
+        self.token = CancellationToken()
+        self._result = None
+        self._cancelled = False
+        self._done = False
+
+        if self.timeout is not None:
+            self.token.deadline = time.monotonic() + self.timeout
+            self._timeout_timer.start(round(self.timeout * 1000))
+
+        key = self._flight_key() if self.coalesce else None
+
+        if key is None:
+            self.worker = self._create_worker(self.token)
+            self.worker.emitter.sig_results_ready.connect(self._on_results_ready)
+            self.worker.emitter.sig_done.connect(self._on_done)
+            executor.start(self.worker, self.priority_class)
+            self._watch_owner(self.token.cancel)
+            return
+
+        self._flight = _flights.get(key)
+
+        if self._flight is None:
+            # the shared worker is only cancelled with all tasks that share it
+            self._flight = _Flight(key, self._create_worker(CancellationToken()))
+            _flights[key] = self._flight
+            executor.start(self._flight.worker, self.priority_class)
+
+        self._flight.tasks.append(self)
+        self.worker = self._flight.worker
+        self._watch_owner(self.token.cancel, self._flight.on_task_cancelled)
+
+    def cancel(self):
+        """Cancels the task, unless it has already completed."""
+        if self._cancelled or self._done:
+            return
+
+        self._cancelled = True
+        self.token.cancel()
+        self._unwatch_owner()
+
+        if self._flight:
+            self._flight.on_task_cancelled()
+
+        self.sig_cancelled.emit()
+
+    def _detach_worker(self):
+        # ignore the results and sig_done of a previous worker
+        if self._flight:
+            self._unwatch_owner()
+            self._flight.discard_task(self)
+            self._flight = None
+        elif self.worker:
+            self._unwatch_owner()
+            self.token.cancel()
+            self.worker.emitter.sig_results_ready.disconnect(self._on_results_ready)
+            self.worker.emitter.sig_done.disconnect(self._on_done)
+
+        self.worker = None
+
+    def _watch_owner(self, *slots):
+        # Cancel the worker from the parent's destroyed signal. The task itself is
+        # deleted with its parent and cannot be relied on to cancel its worker.
+        self._owner = self.parent()
+
+        if self._owner is not None:
+            self._owner_slots = slots
+            for slot in slots:
+                self._owner.destroyed.connect(slot)
+
+    def _unwatch_owner(self):
+        if self._owner is not None and not sip.isdeleted(self._owner):
+            for slot in self._owner_slots:
+                self._owner.destroyed.disconnect(slot)
+
+        self._owner = None
+        self._owner_slots = []
+
+    def _create_worker(self, token):
+        return Worker(
+            target=self._target, args=self._args, kwargs=self._kwargs, token=token
+        )
+
+    def _flight_key(self):
+        key = (
+            self._target,
+            self._args,
+            tuple(sorted(self._kwargs.items())),
+            # an interactive task must not wait for a shared execution in a busy pool
+            self.priority_class,
+        )
+
+        try:
+            hash(key)
+        except TypeError:
+            # tasks with unhashable arguments never coalesce
+            return None
+
+        return key
+
+    def _on_results_ready(self):
+        for res in self.worker.results.take_all():
+            self._deliver(res)
+
+    def _deliver(self, res):
+        # drop results which were pending when the task was cancelled
+        if not self.token.is_cancelled():
+            self._result = res
+            self.sig_result.emit(res)
+
+    def _on_done(self):
+        self._done = True
+        self._unwatch_owner()
+        self.sig_done.emit()
+
+    def __await__(self):
+        results = yield [self]
+        return results[0]
 
 
 class MaestralBackgroundTask(BackgroundTask):
@@ -363,23 +774,139 @@ class MaestralBackgroundTask(BackgroundTask):
         args=None,
         kwargs=None,
         autostart=True,
+        priority_class=TaskExecutor.INTERACTIVE,
+        timeout=None,
+        coalesce=False,
     ):
         self.config_name = config_name
-        super().__init__(parent, target, args, kwargs, autostart)
+        super().__init__(
+            parent, target, args, kwargs, autostart, priority_class, timeout, coalesce
+        )
 
-    def start(self):
-        self.worker = MaestralWorker(
+    def cancel(self):
+        super().cancel()
+
+        # Brute force termination by closing the socket, the daemon call may block.
+        # A shared call is only terminated once all tasks sharing it are cancelled.
+        if self.worker and self.worker.token.is_cancelled() and self.worker.connection:
+            self.worker.connection.close()
+
+    def _create_worker(self, token):
+        return MaestralWorker(
             config_name=self.config_name,
             target=self._target,
             args=self._args,
             kwargs=self._kwargs,
+            token=token,
         )
 
-        self.worker.emitter.sig_result.connect(self.sig_result.emit)
-        self.worker.emitter.sig_done.connect(self.sig_done.emit)
-        thread_pool.start(self.worker)
+    def _flight_key(self):
+        key = super()._flight_key()
+        return key and (self.config_name,) + key
+
+
+class TaskCancelledError(Exception):
+    """Raised in a coroutine when a background task which it awaits was cancelled."""
+
+
+@types.coroutine
+def gather(*tasks):
+    """
+    Awaits several background tasks which run concurrently, in a coroutine run by
+    :class:`CoroutineTask`.
+
+    :param tasks: Instances of :class:`BackgroundTask`.
+    :returns: The last result of each task.
+    :rtype: list
+    """
+    return (yield list(tasks))
+
+
+class CoroutineTask(QtCore.QObject):
+    """
+    Runs a coroutine in the main thread, driven by the Qt event loop. The coroutine can
+    await a :class:`BackgroundTask` to get its last result, or several tasks at once
+    with :func:`gather`, such that a sequence of background calls can be written
+    without chaining callbacks. Awaiting a task which was cancelled raises
+    :class:`TaskCancelledError` in the coroutine.
+
+    The coroutine is started from the event loop, after the caller connected to the
+    signals. `sig_result` is emitted with its return value and `sig_done` once it has
+    finished, also if it failed or was cancelled.
+
+    :param coro: Coroutine to run.
+    :param parent: QObject. Defaults to None.
+    """
+
+    sig_result = Signal(object)
+    sig_done = Signal()
+
+    def __init__(self, coro, parent=None):
+        super().__init__(parent)
+        self._coro = coro
+        self._awaited = []
+        self._pending = {}  # task -> slot connected to its sig_done
+        self._done = False
+
+        QtCore.QTimer.singleShot(0, self._step)
 
     def cancel(self):
-        # brute force termination by closing the socket
-        if self.worker and self.worker.connection:
-            self.worker.connection.close()
+        """Cancels the coroutine and the tasks which it awaits."""
+        if self._done:
+            return
+
+        for task, slot in self._pending.items():
+            task.sig_done.disconnect(slot)
+            task.cancel()
+
+        self._coro.close()
+        self._finish()
+
+    def _step(self, results=None, cancelled=False):
+        if self._done:
+            return
+
+        try:
+            if cancelled:
+                tasks = self._coro.throw(TaskCancelledError())
+            else:
+                tasks = self._coro.send(results)
+        except StopIteration as exc:
+            self.sig_result.emit(exc.value)
+            self._finish()
+            return
+        except TaskCancelledError:
+            self._finish()
+            return
+        except Exception:
+            traceback.print_exc()
+            self._finish()
+            return
+
+        self._awaited = tasks
+
+        for task in tasks:
+            if not task._done:
+                slot = partial(self._on_task_done, task)
+                task.sig_done.connect(slot)
+                self._pending[task] = slot
+
+        if not self._pending:
+            self._resume()
+
+    def _on_task_done(self, task):
+        task.sig_done.disconnect(self._pending.pop(task))
+
+        if not self._pending:
+            self._resume()
+
+    def _resume(self):
+        tasks, self._awaited = self._awaited, []
+        cancelled = any(task._cancelled for task in tasks)
+        self._step([task._result for task in tasks], cancelled)
+
+    def _finish(self):
+        self._done = True
+        self._pending.clear()
+        self._awaited = []
+        self.sig_done.emit()
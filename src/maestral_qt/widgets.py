@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 
 # external packages
-import markdown2
 from PyQt6 import QtWidgets, QtGui, QtCore
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QPixmap, QPainter
@@ -270,6 +269,8 @@ def show_stacktrace_dialog(traceback):
 
 
 def show_update_dialog(latest_release, release_notes_md):
+    import markdown2  # only needed here, not imported on startup
+
     url = f"{__url__}/download"
     message = (
         "Maestral v{0} is available. Please use your package manager to "